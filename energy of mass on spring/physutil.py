@@ -1,4 +1,4 @@
-# physutil.py v1.22
+# physutil.py v1.47
 # Copyright (c) 2011-2012 GT Physics Education Research Group
 # License: GPL-3.0 (http://opensource.org/licenses/GPL-3.0)
 
@@ -8,6 +8,104 @@
 
 # Revisions by date
 
+# v1.47 18 October 2026 -- GT Physics Education Research Group
+# Added PhysLoop, which takes several physics steps per drawn frame and updates timers,
+# trails, graphs and motion maps once per frame
+
+# v1.46 18 October 2026 -- GT Physics Education Research Group
+# PhysTimer only reformats its text when t passes the point where the display next
+# changes, and only writes the label when the text is different
+
+# v1.45 18 October 2026 -- GT Physics Education Research Group
+# Added PhysFrameAxis, a PhysAxis whose ticks are one points object inside a frame that
+# follows the object, for axes with many ticks
+
+# v1.44 18 October 2026 -- GT Physics Education Research Group
+# MotionMap and MotionMapN keep their markers' scene objects (markers) and take
+# maxMarkers, after which the oldest marker is moved to the new spot instead of drawing more
+
+# v1.43 18 October 2026 -- GT Physics Education Research Group
+# MotionMap and MotionMapN work out when the next marker is due once per marker, and
+# gained updateStep (integer step schedule) and markTrajectory (markers from a recording)
+
+# v1.42 18 October 2026 -- GT Physics Education Research Group
+# Added PhysCollisions, grid-based collision detection and response (elastic, partly
+# elastic, or merging) for many spheres
+
+# v1.41 18 October 2026 -- GT Physics Education Research Group
+# Added contactTime and inelasticStep, swept-sphere collision detection that finds the
+# moment two balls touch within a step and merges them (perfectly inelastic) there
+
+# v1.40 18 October 2026 -- GT Physics Education Research Group
+# Added zero-crossing events to the integrators (addEvent, eventLog, stopped), located
+# within the step on a quintic dense-output interpolant (interpolate)
+
+# v1.39 18 October 2026 -- GT Physics Education Research Group
+# Added PhysKepler, a universal-variable Kepler propagator that gives a two-body orbit's
+# position and velocity at any time directly; PhysBinary now uses it
+
+# v1.38 18 October 2026 -- GT Physics Education Research Group
+# Added PhysBinary, which places the two stars of a binary system at any time from
+# the exact two-body solution and gives the acceleration of a light third body
+
+# v1.37 18 October 2026 -- GT Physics Education Research Group
+# Added gravityAcceleration, an all-pairs NumPy gravity kernel with Plummer softening
+# and a float32 option; PhysGravity uses it for its direct path and takes softening
+
+# v1.36 18 October 2026 -- GT Physics Education Research Group
+# Added PhysGravity, an N-body gravity acceleration function with a direct path for
+# small N and a Barnes-Hut octree (adjustable opening angle) for large N
+
+# v1.35 18 October 2026 -- GT Physics Education Research Group
+# Added sweep, which runs a model headless over a grid of parameter values in a
+# process pool and collects what each run prints into one results table
+
+# v1.34 18 October 2026 -- GT Physics Education Research Group
+# Added saveCheckpoint and loadCheckpoint, with getState / setState on MotionMap,
+# MotionMapN, PhysTimer, PhysGraph, PhysTrail and the integrators
+
+# v1.33 18 October 2026 -- GT Physics Education Research Group
+# Added PhysReplay, which plays back a PhysRecorder file at any speed, with seeking
+# and scrubbing, driving the object, timers, trails, graphs and motion maps
+
+# v1.32 18 October 2026 -- GT Physics Education Research Group
+# Added PhysRecorder, which streams each step's state to a .npy file in chunks
+
+# v1.31 18 October 2026 -- GT Physics Education Research Group
+# Added PhysTrail, a trail with a maximum length (ring buffer) and optional
+# spacing between points, for long runs
+
+# v1.30 18 October 2026 -- GT Physics Education Research Group
+# Added bufferSize and flush() to PhysGraph, which collect samples in an array and
+# send them to the curves in bulk
+
+# v1.29 18 October 2026 -- GT Physics Education Research Group
+# Added maxPoints to PhysGraph, capping the points drawn per curve with min/max
+# decimation that compacts older history as the run goes on
+
+# v1.28 18 October 2026 -- GT Physics Education Research Group
+# Added symplectic stepping methods (verlet / leapfrog and yoshida4) to PhysIntegrator
+
+# v1.27 18 October 2026 -- GT Physics Education Research Group
+# Added PhysAdaptiveIntegrator, a Dormand-Prince (RK45) integrator whose time step
+# adapts to keep the estimated error within user-set tolerances
+
+# v1.26 18 October 2026 -- GT Physics Education Research Group
+# Added PhysLaunchSolver, which brackets and refines the launch angle for a target
+# range using cached simulated flights and counts the integrations it needed
+
+# v1.25 18 October 2026 -- GT Physics Education Research Group
+# Added PhysEnsemble, which integrates N independent parameter variants of a model
+# as one (N, 3) state array and records when each member's running condition fails
+
+# v1.24 18 October 2026 -- GT Physics Education Research Group
+# Added PhysIntegrator, which keeps positions and velocities in NumPy arrays,
+# steps them with Euler or Euler-Cromer and syncs the scene objects on request
+
+# v1.23 18 October 2026 -- GT Physics Education Research Group
+# Added headless mode ("python physutil.py --headless model.py") which replaces visual
+# with inert stand-ins and turns rate() into a no-op
+
 # v1.22 24 January 2011 -- Danny Caballero
 # Added labelColor attribute to PhysAxis, MotionMap, and MotionMapN
 # controls color of text
@@ -44,6 +142,440 @@
 
 from __future__ import division
 import unittest
+import csv
+import itertools
+import math
+import multiprocessing
+import numpy
+import os
+import pickle
+import re
+import runpy
+import struct
+import sys
+import tempfile
+import types
+import time
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+"""
+#
+#
+# HEADLESS MODE SETUP CODE ------------------------------------------------------------
+#
+#
+"""
+
+# Headless mode runs a model without opening any windows: visual is replaced by
+# inert stand-ins that only remember their attributes, and rate() returns
+# immediately so the calculation loop runs at full CPU speed (useful for CI and
+# batch grading). Run models headless with:
+#     python physutil.py --headless "projectile motion.py"
+# The stand-ins have to be in place before the model's own "from visual import *",
+# so setting PHYSUTIL_HEADLESS=1 only helps a program that imports physutil before
+# visual (as sweep's worker processes do); it does not make "python model.py" headless.
+headless = os.environ.get("PHYSUTIL_HEADLESS", "0") not in ("", "0")
+if __name__ == "__main__" and sys.argv[1:2] == ["--headless"]:
+    headless = True
+    os.environ["PHYSUTIL_HEADLESS"] = "1"
+
+class _HeadlessVector(object):
+    """
+    Pure Python stand-in for visual's vector, used in headless mode.
+    """
+
+    __slots__ = ("x", "y", "z")
+
+    # Keep numpy scalars from turning "scalar * vector" into an array
+    __array_ufunc__ = None
+
+    def __init__(self, x=0, y=0, z=0):
+        if hasattr(x, "__len__"):
+            x, y, z = (list(x) + [0, 0, 0])[:3]
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __add__(self, other):
+        other = _asHeadlessVector(other)
+        return _HeadlessVector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other = _asHeadlessVector(other)
+        return _HeadlessVector(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __rsub__(self, other):
+        return _asHeadlessVector(other) - self
+
+    def __mul__(self, scalar):
+        return _HeadlessVector(self.x * scalar, self.y * scalar, self.z * scalar)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return _HeadlessVector(self.x / scalar, self.y / scalar, self.z / scalar)
+
+    __div__ = __truediv__
+
+    def __neg__(self):
+        return _HeadlessVector(-self.x, -self.y, -self.z)
+
+    def __pos__(self):
+        return _HeadlessVector(self.x, self.y, self.z)
+
+    def __eq__(self, other):
+        try:
+            other = _asHeadlessVector(other)
+        except (TypeError, ValueError):
+            return False
+        return self.x == other.x and self.y == other.y and self.z == other.z
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z)[i]
+
+    def __setitem__(self, i, value):
+        setattr(self, ("x", "y", "z")[i], float(value))
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __repr__(self):
+        return "<%.15g, %.15g, %.15g>" % (self.x, self.y, self.z)
+
+    __str__ = __repr__
+
+    def mag2(self):
+        return self.x * self.x + self.y * self.y + self.z * self.z
+
+    def _getMag(self):
+        return math.sqrt(self.mag2())
+
+    def _setMag(self, value):
+        length = self._getMag()
+        if length == 0:
+            self.x = self.y = self.z = 0.0
+        else:
+            scale = value / length
+            self.x *= scale
+            self.y *= scale
+            self.z *= scale
+
+    mag = property(_getMag, _setMag)
+
+    def norm(self):
+        length = self._getMag()
+        if length == 0:
+            return _HeadlessVector(0, 0, 0)
+        return self / length
+
+    def dot(self, other):
+        other = _asHeadlessVector(other)
+        return self.x * other.x + self.y * other.y + self.z * other.z
+
+    def cross(self, other):
+        other = _asHeadlessVector(other)
+        return _HeadlessVector(self.y * other.z - self.z * other.y,
+            self.z * other.x - self.x * other.z,
+            self.x * other.y - self.y * other.x)
+
+    def diff_angle(self, other):
+        other = _asHeadlessVector(other)
+        denominator = self._getMag() * other._getMag()
+        if denominator == 0:
+            return 0.0
+        return math.acos(max(-1.0, min(1.0, self.dot(other) / denominator)))
+
+    def rotate(self, angle=0, axis=(0, 0, 1)):
+        # Rodrigues' rotation formula
+        k = _asHeadlessVector(axis).norm()
+        c = math.cos(angle)
+        s = math.sin(angle)
+        return self * c + k.cross(self) * s + k * (k.dot(self) * (1 - c))
+
+def _asHeadlessVector(v):
+    return v if isinstance(v, _HeadlessVector) else _HeadlessVector(v)
+
+def _headlessMag(v):
+    return _asHeadlessVector(v).mag
+
+def _headlessMag2(v):
+    return _asHeadlessVector(v).mag2()
+
+def _headlessNorm(v):
+    return _asHeadlessVector(v).norm()
+
+def _headlessDot(a, b):
+    return _asHeadlessVector(a).dot(b)
+
+def _headlessCross(a, b):
+    return _asHeadlessVector(a).cross(b)
+
+def _headlessDiffAngle(a, b):
+    return _asHeadlessVector(a).diff_angle(b)
+
+def _headlessRotate(v, angle=0, axis=(0, 0, 1)):
+    return _asHeadlessVector(v).rotate(angle, axis)
+
+def _headlessComp(a, b):
+    return _asHeadlessVector(a).dot(_headlessNorm(b))
+
+def _headlessProj(a, b):
+    unit = _headlessNorm(b)
+    return unit * _asHeadlessVector(a).dot(unit)
+
+def _headlessRate(frequency):
+    # Nothing is being drawn, so there is nothing to wait for
+    pass
+
+class _HeadlessObject(object):
+    """
+    Inert stand-in for any visual / visual.graph object; remembers its attributes
+    and silently accepts method calls.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        for name in kwargs:
+            setattr(self, name, kwargs[name])
+
+    def __getattr__(self, name):
+        # Only called for attributes that were never set, e.g. scene.forward
+        # or gcurve.plot; hand back a no-op so the model keeps running
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _HeadlessObject()
+
+    def __call__(self, *args, **kwargs):
+        return None
+
+class _HeadlessPrimitive(_HeadlessObject):
+    """
+    Stand-in for visual's 3D primitives (sphere, box, helix, ...), keeping pos,
+    axis, size and length consistent the way visual does.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._pos = _HeadlessVector(0, 0, 0)
+        self._axis = _HeadlessVector(1, 0, 0)
+        self.up = _HeadlessVector(0, 1, 0)
+        self.height = 1.0
+        self.width = 1.0
+        self.radius = 1.0
+        self.color = (1, 1, 1)
+        _HeadlessObject.__init__(self, *args, **kwargs)
+
+    def _getPos(self):
+        return self._pos
+
+    def _setPos(self, value):
+        self._pos = _HeadlessVector(value)
+
+    pos = property(_getPos, _setPos)
+
+    def _getAxis(self):
+        return self._axis
+
+    def _setAxis(self, value):
+        self._axis = _HeadlessVector(value)
+
+    axis = property(_getAxis, _setAxis)
+
+    def _getLength(self):
+        return self._axis.mag
+
+    def _setLength(self, value):
+        self._axis.mag = value
+
+    length = property(_getLength, _setLength)
+
+    def _getSize(self):
+        return _HeadlessVector(self._axis.mag, self.height, self.width)
+
+    def _setSize(self, value):
+        value = _HeadlessVector(value)
+        self._axis.mag = value.x
+        self.height = value.y
+        self.width = value.z
+
+    size = property(_getSize, _setSize)
+
+    def rotate(self, angle=0, axis=(0, 0, 1), origin=None):
+        origin = self._pos if origin is None else _HeadlessVector(origin)
+        self._pos = origin + (self._pos - origin).rotate(angle, axis)
+        self._axis = self._axis.rotate(angle, axis)
+        self.up = self.up.rotate(angle, axis)
+
+class _HeadlessCurve(_HeadlessObject):
+    """
+    Stand-in for visual's curve and points, whose pos is a list of points.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._pos = []
+        self.color = (1, 1, 1)
+        _HeadlessObject.__init__(self, *args, **kwargs)
+
+    def _getPos(self):
+        return self._pos
+
+    def _setPos(self, value):
+        if len(value) > 0 and hasattr(value[0], "__len__"):
+            self._pos = [_HeadlessVector(point) for point in value]
+        else:
+            self._pos = _HeadlessVector(value)
+
+    pos = property(_getPos, _setPos)
+
+    def append(self, pos=None, retain=None, **kwargs):
+        if not isinstance(self._pos, list):
+            self._pos = [self._pos]
+        self._pos.append(_HeadlessVector(pos))
+        if retain is not None and len(self._pos) > retain:
+            del self._pos[:len(self._pos) - retain]
+
+class _HeadlessLabel(_HeadlessObject):
+    """
+    Stand-in for visual's label.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._pos = _HeadlessVector(0, 0, 0)
+        self.text = ""
+        _HeadlessObject.__init__(self, *args, **kwargs)
+
+    def _getPos(self):
+        return self._pos
+
+    def _setPos(self, value):
+        self._pos = _HeadlessVector(value)
+
+    pos = property(_getPos, _setPos)
+
+class _HeadlessMouse(_HeadlessObject):
+    """
+    Stand-in for scene.mouse. Nobody is there to click, so getclick() returns at
+    once, and clicked / events report one click after clickAfter polls; otherwise
+    a model that runs until the user clicks would never end.
+    """
+
+    clickAfter = 10000
+
+    def __init__(self, *args, **kwargs):
+        self.polls = 0
+        _HeadlessObject.__init__(self, *args, **kwargs)
+
+    def _getClicked(self):
+        self.polls += 1
+        if self.polls < self.clickAfter:
+            return 0
+        self.polls = 0
+        return 1
+
+    clicked = property(_getClicked)
+    events = property(_getClicked)
+
+    def getclick(self):
+        self.polls = 0
+        return _HeadlessObject(pos=_HeadlessVector(0, 0, 0), button="left")
+
+    getevent = getclick
+
+class _HeadlessDisplay(_HeadlessObject):
+    """
+    Stand-in for visual's display (and therefore scene).
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.mouse = _HeadlessMouse()
+        self.objects = []
+        _HeadlessObject.__init__(self, *args, **kwargs)
+
+class _HeadlessColor(object):
+    """
+    Stand-in for visual's color module.
+    """
+
+    red = (1, 0, 0)
+    green = (0, 1, 0)
+    blue = (0, 0, 1)
+    yellow = (1, 1, 0)
+    orange = (1, 0.6, 0)
+    cyan = (0, 1, 1)
+    magenta = (1, 0, 1)
+    white = (1, 1, 1)
+    black = (0, 0, 0)
+
+    @staticmethod
+    def gray(luminance):
+        return (luminance, luminance, luminance)
+
+    grey = gray
+
+def _headlessPrimitiveType(name, base=_HeadlessPrimitive):
+    # Each visual primitive gets its own class so that checks like
+    # "type(obj) == box" in obj_size keep working
+    return type(name, (base,), {})
+
+def _installHeadlessVisual():
+    # Register stand-in "visual" and "visual.graph" modules so that every later
+    # "from visual import *" (in physutil and in the model itself) picks them up
+    existing = sys.modules.get("visual")
+    if existing is not None and getattr(existing, "headless", False):
+        return
+
+    visualModule = types.ModuleType("visual")
+    for name in dir(math):
+        if not name.startswith("_"):
+            setattr(visualModule, name, getattr(math, name))
+    visualModule.math = math
+    visualModule.headless = True
+    visualModule.vector = _HeadlessVector
+    visualModule.mag = _headlessMag
+    visualModule.mag2 = _headlessMag2
+    visualModule.norm = _headlessNorm
+    visualModule.dot = _headlessDot
+    visualModule.cross = _headlessCross
+    visualModule.diff_angle = _headlessDiffAngle
+    visualModule.rotate = _headlessRotate
+    visualModule.comp = _headlessComp
+    visualModule.proj = _headlessProj
+    visualModule.rate = _headlessRate
+    visualModule.color = _HeadlessColor
+    for name in ["sphere", "box", "cylinder", "cone", "pyramid", "arrow",
+                "helix", "ring", "ellipsoid", "frame", "text"]:
+        setattr(visualModule, name, _headlessPrimitiveType(name))
+    visualModule.curve = _headlessPrimitiveType("curve", _HeadlessCurve)
+    visualModule.points = _headlessPrimitiveType("points", _HeadlessCurve)
+    visualModule.label = _headlessPrimitiveType("label", _HeadlessLabel)
+    visualModule.display = _headlessPrimitiveType("display", _HeadlessDisplay)
+    visualModule.scene = visualModule.display()
+
+    graphModule = types.ModuleType("visual.graph")
+    for name in dir(visualModule):
+        if not name.startswith("_"):
+            setattr(graphModule, name, getattr(visualModule, name))
+    for name in ["gdisplay", "gcurve", "gdots", "gvbars", "ghbars", "ghistogram"]:
+        setattr(graphModule, name, _headlessPrimitiveType(name, _HeadlessObject))
+    visualModule.graph = graphModule
+
+    sys.modules["visual"] = visualModule
+    sys.modules["visual.graph"] = graphModule
+
+if headless:
+    _installHeadlessVisual()
 
 """
 #
@@ -56,7 +588,11 @@ import unittest
 # Determine whether we are being used as a module or just running unittests (for mock purposes this is important)
 if __name__ == "__main__":
     # If we are unit testing, set up mock objects (must be done before classes are defined below!)
-    from visual import vector
+    try:
+        from visual import vector
+    except ImportError:
+        # No VPython installed; the headless vector is enough for the tests
+        vector = _HeadlessVector
     class Mock:
         def __init__(self, name, *args, **kwargs):
             self.name = name
@@ -87,6 +623,8 @@ if __name__ == "__main__":
     label = Mock("label")
     points = Mock("points")
     curve = Mock("curve")
+    frame = Mock("frame")
+    rate = Mock("rate")
     gdisplay = Mock("gdisplay")
     gcurve = Mock("gcurve")
     gcurve.plots = []
@@ -139,7 +677,8 @@ class MotionMap:
     def __init__(self, obj, tf, numMarkers, markerType="arrow", 
                 markerScale=1, markerColor=color.red, 
                 labelMarkerOrder=True, labelMarkerOffset=vector(0,0,0),
-                dropTime=False, timeOffset=vector(0,0,0), arrowOffset=vector(0,0,0), labelColor=color.white):
+                dropTime=False, timeOffset=vector(0,0,0), arrowOffset=vector(0,0,0), labelColor=color.white,
+                dt=None, maxMarkers=None):
         # MotionMap
         # obj - object to track in mapping / placing markers
         # tf - expected tFinal, used to space marker placement over time
@@ -152,8 +691,11 @@ class MotionMap:
         # dropTime - boolean determining whether a timestamp should be placed along with the marker
         # timeOffset - if dropTime is True, determines the offset, if any, of the label from the marker
         # arrowOffset - shift an arrow by an amount (x,y,z), useful for two arrows views
+        # dt - time step of the model, needed only to update by step number (updateStep)
+        # maxMarkers - most markers to keep on screen; after that the oldest are moved to the new spots
 
         self.obj = obj
+        self.dt = dt
         self.tf = tf
         self.numMarkers = numMarkers
         self.markerType = markerType
@@ -177,30 +719,39 @@ class MotionMap:
             raise err
         self.curMarker = 0
 
+        # When the next marker is due (worked out once per marker rather than on every update)
+        self._scheduledMarker = None
+
+        # Scene objects of each marker drawn, as (marker, time label, order label), and
+        # the next one to reuse once there are maxMarkers of them
+        self.maxMarkers = maxMarkers
+        self.markers = []
+        self.oldestMarker = 0
+
 
     def update(self, t, quantity=1):
         try:
             # Display new arrow if t has broken next threshold
-            if t > (self.interval * self.curMarker):
-                # Increment threshold
-                self.curMarker += 1
-                
-                # Display marker!
-                if self.markerType == "arrow":
-                    arrow(pos=self.obj.pos+self.arrowOffset, 
-                        axis=self.markerScale*quantity, color=self.markerColor)
-                elif self.markerType == "breadcrumbs":
-                    points(pos=self.obj.pos, 
-                        size=10*self.markerScale*quantity, color=self.markerColor)
-
-                #Also display timestamp if requested
-                if self.dropTime is not False:
-                    epsilon = vector(0,self.markerScale*.5,0)+self.timeOffset
-                    droptimeText = label(pos=self.obj.pos+epsilon, text='t='+str(t)+'s', height=10, box=False, color=self.labelColor)
+            if self.curMarker != self._scheduledMarker:
+                self._schedule()
+            if t > self.nextMarkerTime:
+                _dropMotionMapMarker(self, t, self.obj.pos, quantity)
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
 
-                # Same with order label
-                if self.labelMarkerOrder is not False:
-                    label(pos=self.obj.pos-vector(0,self.markerScale*.5,0)+self.labelMarkerOffset, text=str(self.curMarker), height=10, box=False, color=self.labelColor)
+    def updateStep(self, step, quantity=1):
+        # Same as update, but for the step number (t = step * dt), compared as an integer
+        try:
+            if self.dt is None:
+                raise Exception("ERROR: MotionMap needs dt to be updated by step number!")
+            if self.curMarker != self._scheduledMarker:
+                self._schedule()
+            if step >= self.nextMarkerStep:
+                _dropMotionMapMarker(self, step * self.dt, self.obj.pos, quantity)
         except TypeError as err:
             print("**********TYPE ERROR**********")
             print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
@@ -208,6 +759,28 @@ class MotionMap:
             print(err)
             raise err
 
+    def _schedule(self):
+        # The next marker is due once t passes nextMarkerTime, i.e. from step nextMarkerStep
+        self._scheduledMarker = self.curMarker
+        self.nextMarkerTime = self.interval * self.curMarker
+        if self.dt is not None:
+            self.nextMarkerStep = int(math.floor(self.nextMarkerTime / self.dt)) + 1
+
+    def markTrajectory(self, times, positions, quantities=None):
+        # Place the markers for a whole recorded run at once (e.g. from PhysRecorder),
+        # exactly where update would have placed them; returns the number placed
+        # times - (N,) increasing times of the samples
+        # positions - (N, 3) positions of the object
+        # quantities - (N,) or (N, 3) quantity at each sample (1 if not given)
+        return _markTrajectory(self, times, positions, quantities, "right")
+
+    def getState(self):
+        # Marker count, for saveCheckpoint
+        return {"curMarker": self.curMarker}
+
+    def setState(self, state):
+        self.curMarker = state["curMarker"]
+
 class MotionMapN:
     """
     This class assists students in constructing motion maps 
@@ -218,7 +791,8 @@ class MotionMapN:
     def __init__(self, obj, dt, numSteps, markerType="arrow", 
                 markerScale=1, markerColor=color.red, 
                 labelMarkerOrder=True, labelMarkerOffset=vector(0,0,0),
-                dropTime=False, timeOffset=vector(0,0,0), arrowOffset=vector(0,0,0), labelColor=color.white):
+                dropTime=False, timeOffset=vector(0,0,0), arrowOffset=vector(0,0,0), labelColor=color.white,
+                maxMarkers=None):
         # MotionMapN
         # obj - object to track in mapping / placing markers
         # dt - time between steps
@@ -231,6 +805,7 @@ class MotionMapN:
         # dropTime - boolean determining whether a timestamp should be placed along with the marker
         # timeOffset - if dropTime is True, determines the offset, if any, of the label from the markers
         # arrowOffset - shift an arrow by an amount (x,y,z), useful for two arrows views
+        # maxMarkers - most markers to keep on screen; after that the oldest are moved to the new spots
         
         self.obj = obj
         self.dt = dt
@@ -256,34 +831,37 @@ class MotionMapN:
             raise err
         self.curMarker = 0
 
+        # When the next marker is due (worked out once per marker rather than on every update)
+        self._scheduledMarker = None
+
+        # Scene objects of each marker drawn, as (marker, time label, order label), and
+        # the next one to reuse once there are maxMarkers of them
+        self.maxMarkers = maxMarkers
+        self.markers = []
+        self.oldestMarker = 0
+
 
     def update(self, t, quantity=1):
         try:
-
-            threshold = self.interval * self.curMarker
             # Display new arrow if t has broken new threshold
-            if t >= threshold:
+            if self.curMarker != self._scheduledMarker:
+                self._schedule()
+            if t >= self.nextMarkerTime:
+                _dropMotionMapMarker(self, t, self.obj.pos, quantity)
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
 
-                # Increment marker count
-                self.curMarker += 1
-                
-                # Display marker!
-                if self.markerType == "arrow":
-                    arrow(pos=self.obj.pos+self.arrowOffset, 
-                        axis=self.markerScale*quantity, color=self.markerColor)
-                elif self.markerType == "breadcrumbs":
-                    points(pos=self.obj.pos, 
-                        size=10*self.markerScale*quantity, color=self.markerColor)
-
-                #Also display timestamp if requested
-                if self.dropTime is not False:
-                    epsilon = vector(0,self.markerScale*.5,0)+self.timeOffset
-                    droptimeText = label(pos=self.obj.pos+epsilon, text='t='+str(t)+'s', height=10, box=False, color=self.labelColor)
-
-                # Same with order label
-                if self.labelMarkerOrder is not False:
-                    label(pos=self.obj.pos-vector(0,self.markerScale*.5,0)+self.labelMarkerOffset, text=str(self.curMarker), height=10, box=False, color=self.labelColor)
-                
+    def updateStep(self, step, quantity=1):
+        # Same as update, but for the step number (t = step * dt): a marker every numSteps steps
+        try:
+            if self.curMarker != self._scheduledMarker:
+                self._schedule()
+            if step >= self.nextMarkerStep:
+                _dropMotionMapMarker(self, step * self.dt, self.obj.pos, quantity)
         except TypeError as err:
             print("**********TYPE ERROR**********")
             print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
@@ -291,6 +869,107 @@ class MotionMapN:
             print(err)
             raise err
 
+    def _schedule(self):
+        # The next marker is due once t reaches nextMarkerTime, i.e. at step nextMarkerStep
+        self._scheduledMarker = self.curMarker
+        self.nextMarkerTime = self.interval * self.curMarker
+        self.nextMarkerStep = self.numSteps * self.curMarker
+
+    def markTrajectory(self, times, positions, quantities=None):
+        # Place the markers for a whole recorded run at once (e.g. from PhysRecorder),
+        # exactly where update would have placed them; returns the number placed
+        # times - (N,) increasing times of the samples
+        # positions - (N, 3) positions of the object
+        # quantities - (N,) or (N, 3) quantity at each sample (1 if not given)
+        return _markTrajectory(self, times, positions, quantities, "left")
+
+    def getState(self):
+        # Marker count, for saveCheckpoint
+        return {"curMarker": self.curMarker}
+
+    def setState(self, state):
+        self.curMarker = state["curMarker"]
+
+def _dropMotionMapMarker(motionMap, t, pos, quantity):
+    # Draw the next marker of a MotionMap or MotionMapN at pos, with its labels;
+    # once the map has maxMarkers markers, the oldest one is moved here instead
+    motionMap.curMarker += 1
+    if motionMap.maxMarkers is not None and len(motionMap.markers) >= motionMap.maxMarkers:
+        _moveMotionMapMarker(motionMap, t, pos, quantity)
+        return
+    marker = timeLabel = orderLabel = None
+
+    # Display marker!
+    if motionMap.markerType == "arrow":
+        marker = arrow(pos=pos+motionMap.arrowOffset, 
+            axis=motionMap.markerScale*quantity, color=motionMap.markerColor)
+    elif motionMap.markerType == "breadcrumbs":
+        marker = points(pos=pos, 
+            size=10*motionMap.markerScale*quantity, color=motionMap.markerColor)
+
+    #Also display timestamp if requested
+    if motionMap.dropTime is not False:
+        timeLabel = label(pos=pos+_timeLabelOffset(motionMap), text='t='+str(t)+'s', height=10, box=False, color=motionMap.labelColor)
+
+    # Same with order label
+    if motionMap.labelMarkerOrder is not False:
+        orderLabel = label(pos=pos+_orderLabelOffset(motionMap), text=str(motionMap.curMarker), height=10, box=False, color=motionMap.labelColor)
+
+    motionMap.markers.append((marker, timeLabel, orderLabel))
+
+def _timeLabelOffset(motionMap):
+    # Time label position relative to the marker, for the current markerScale
+    return vector(0,motionMap.markerScale*.5,0)+motionMap.timeOffset
+
+def _orderLabelOffset(motionMap):
+    return motionMap.labelMarkerOffset-vector(0,motionMap.markerScale*.5,0)
+
+def _moveMotionMapMarker(motionMap, t, pos, quantity):
+    # Reuse the oldest marker's scene objects for the newest marker
+    marker, timeLabel, orderLabel = motionMap.markers[motionMap.oldestMarker]
+    motionMap.oldestMarker = (motionMap.oldestMarker + 1) % len(motionMap.markers)
+    if motionMap.markerType == "arrow":
+        marker.pos = pos+motionMap.arrowOffset
+        marker.axis = motionMap.markerScale*quantity
+    elif motionMap.markerType == "breadcrumbs":
+        marker.pos = pos
+        marker.size = 10*motionMap.markerScale*quantity
+    if timeLabel is not None:
+        timeLabel.pos = pos+_timeLabelOffset(motionMap)
+        timeLabel.text = 't='+str(t)+'s'
+    if orderLabel is not None:
+        orderLabel.pos = pos+_orderLabelOffset(motionMap)
+        orderLabel.text = str(motionMap.curMarker)
+
+def _markTrajectory(motionMap, times, positions, quantities, side):
+    # Marker k goes at the first sample past threshold k (searchsorted side "right"
+    # for t > threshold, "left" for t >= threshold), but at most one marker per
+    # sample, as with one update call per sample
+    try:
+        times = numpy.asarray(times, dtype=float).reshape(-1)
+        positions = numpy.asarray(positions, dtype=float).reshape(-1, 3)
+        if quantities is not None:
+            quantities = numpy.asarray(quantities, dtype=float)
+        count = numpy.arange(len(times))
+        first = numpy.searchsorted(times, motionMap.interval * (motionMap.curMarker + count), side=side)
+        samples = numpy.maximum.accumulate(first - count) + count
+        samples = samples[samples < len(times)]
+        for i in samples:
+            if quantities is None:
+                quantity = 1
+            elif quantities.ndim == 2:
+                quantity = vector(quantities[i, 0], quantities[i, 1], quantities[i, 2])
+            else:
+                quantity = quantities[i]
+            _dropMotionMapMarker(motionMap, times[i], vector(positions[i, 0], positions[i, 1], positions[i, 2]), quantity)
+        return len(samples)
+    except TypeError as err:
+        print("**********TYPE ERROR**********")
+        print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+        print("******************************")
+        print(err)
+        raise err
+
 class PhysAxis:
     """
     This class assists students in creating dynamic axes for their models.
@@ -421,25 +1100,49 @@ class PhysAxis:
         else:
             self.axisCurve = curve(pos=[self.startPos,final],color = self.axisColor)
     
-class PhysTimer:
+class PhysFrameAxis:
     """
-    This class assists students in creating an onscreen timer display.
+    This class assists students in creating dynamic axes for their models, the
+    same way as PhysAxis, but for axes with many ticks that follow a moving
+    object: the tick marks are a single points object and, together with the
+    line, sit in a frame, so following the object moves the frame once rather
+    than every tick.
     """
-    
-    def __init__(self, x, y, useScientific=False, timerColor=color.white):
-        
-        # PhysTimer
-        # x,y - world coordinates for the timer location
-        # useScientific - bool to turn off/on scientific notation for time
-        # timerColor - attribute controlling the color of the text
-        
+
+    def __init__(self, obj, numLabels, axisType="x", axis=vector(1,0,0), startPos=None, 
+                length=None, labels = None, labelOrientation="down", axisColor=color.yellow, labelColor=color.white):
+        # PhysFrameAxis
+        # obj - Object which axis is oriented based on by default
+        # numLabels - number of labels on axis
+        # axisType - sets whether this is a default axis of x or y, or an arbitrary axis
+        # axis - unit vector defining the orientation of the axis to be created IF axisType = "arbitrary"
+        # startPos - start position for the axis - defaults to (-obj_size(obj).x/2,-4*obj_size(obj).y,0)
+        # length - length of the axis - defaults to obj_size(obj).x
+        # labelOrientation - how labels are placed relative to axis markers - "up", "down", "left", or "right"
+
         try:
-            self.useScientific = useScientific
-            self.timerColor = timerColor
-            if useScientific is False:
-                self.timerLabel = label(pos=vector(x,y,0), text='00:00:00.00', box=False)
-            else:
-                self.timerLabel = label(pos=vector(x,y,0), text='00E01', box=False)
+            self.intervalLabels = []
+            self.labelText = labels
+            self.obj = obj
+            self.numLabels = numLabels
+            self.axisType = axisType
+            self.axis = axis if axisType != "y" else vector(0,1,0)
+            self.length = length if (length is not None) else obj_size(obj).x
+            self.startPos = startPos if (startPos is not None) else vector(-obj_size(obj).x/2,-4*obj_size(obj).y,0)
+            self.axisColor = axisColor
+            self.labelColor = labelColor
+            self.labelShift = vector(0,-0.05*self.length,0)
+            self.__setLabelShift(labelOrientation)
+
+            # The frame starts at the origin and is then moved by however far obj has
+            # moved, so positions in it are the positions the axis was set up with
+            self.originPos = vector(self.obj.pos.x, self.obj.pos.y, self.obj.pos.z)
+            self.lastPos = vector(self.obj.pos.x, self.obj.pos.y, self.obj.pos.z)
+            self.frame = frame(pos=vector(0,0,0))
+            self.tickMarkers = None
+            self.axisCurve = None
+
+            self.__reorient()
         except TypeError as err:
             print("**********TYPE ERROR**********")
             print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
@@ -447,20 +1150,24 @@ class PhysTimer:
             print(err)
             raise err
 
-    def update(self, t):
+    def __setLabelShift(self, labelOrientation):
+        if labelOrientation == "down":
+            self.labelShift = vector(0,-0.05*self.length,0)
+        elif labelOrientation == "up":
+            self.labelShift = vector(0,0.05*self.length,0)
+        elif labelOrientation == "left":
+            self.labelShift = vector(-0.1*self.length,0,0)
+        elif labelOrientation == "right":
+            self.labelShift = vector(0.1*self.length,0,0)
+
+    def update(self):
         try:
-            # Basically just use sprintf formatting according to either stopwatch or scientific notation
-            if self.useScientific:
-                self.timerLabel.text = "%.4E" % t
-            else:
-                hours = int(t / 3600)
-                mins = int((t / 60) % 60)
-                secs = int(t % 60)
-                frac = int(round(100 * (t % 1)))
-                if frac == 100:
-                    frac = 0
-                    secs = secs + 1;
-                self.timerLabel.text = "%02d:%02d:%02d.%02d" % (hours, mins, secs, frac)
+            # Determine if reference obj. has shifted since last update, if so move the frame
+            if self.obj.pos != self.lastPos:
+                self.frame.pos = self.obj.pos - self.originPos
+                for i in range(len(self.intervalLabels)):
+                    self.intervalLabels[i].pos = self.frame.pos + self.labelPositions[i]
+                self.lastPos = vector(self.obj.pos.x, self.obj.pos.y, self.obj.pos.z)
         except TypeError as err:
             print("**********TYPE ERROR**********")
             print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
@@ -468,25 +1175,1872 @@ class PhysTimer:
             print(err)
             raise err
 
-class PhysGraph:
-    """
-    This class assists students in creating graphs with advanced functionality.
-    """ 
-    
-    # Static, pre-determined list of colors from which each line will be generated
-    graphColors = [color.red, color.green, color.blue, color.yellow, 
-                    color.orange, color.cyan, color.magenta, color.white]
-
-    def __init__(self, numPlots=1):
+    def reorient(self, axis=None, startPos=None, length=None, labels=None, labelOrientation=None):
         try:
-            # Create our specific graph window
-            self.graphDisplay = gdisplay(475,350)
-            self.numPlots = numPlots
-
-            # Initialize each plot curve
+            # Determine which, if any, parameters are being modified
+            self.axis = axis if axis is not None else self.axis
+            self.startPos = startPos if startPos is not None else self.startPos
+            self.length = length if length is not None else self.length
+            self.labelText = labels if labels is not None else self.labelText
+            self.__setLabelShift(labelOrientation)
+
+            self.__reorient()
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def __reorient(self):
+        # Positions of the ticks and labels within the frame (startPos etc. are in the
+        # scene as it was when the axis was set up)
+        final = self.startPos + (self.length * self.axis)
+        interval = (self.length / (self.numLabels-1)) * self.axis
+        tickPositions = [self.startPos+(i*interval) for i in range(self.numLabels)]
+        self.labelPositions = [tickPos+self.labelShift for tickPos in tickPositions]
+
+        # One points object for every tick, and the line itself
+        if self.tickMarkers is None:
+            self.tickMarkers = points(frame=self.frame, pos=tickPositions, color=self.axisColor, size=6)
+            self.axisCurve = curve(frame=self.frame, pos=[self.startPos,final], color=self.axisColor)
+        else:
+            self.tickMarkers.pos = tickPositions
+            self.axisCurve.pos = [self.startPos,final]
+
+        # Labels can't go in a frame, so they are placed relative to it
+        for i in range(self.numLabels):
+            if self.labelText is not None:
+                labelText = self.labelText[i]
+            elif self.axisType == "y":
+                labelText = "%.2f" % tickPositions[i].y 
+            else:
+                labelText = "%.2f" % tickPositions[i].x
+
+            if i < len(self.intervalLabels):
+                self.intervalLabels[i].pos = self.frame.pos + self.labelPositions[i]
+                self.intervalLabels[i].text = str(labelText)
+            else:
+                self.intervalLabels.append(
+                    label(pos=self.frame.pos + self.labelPositions[i], text=str(labelText),box=False,height = 8, color=self.labelColor) )
+
+class PhysTimer:
+    """
+    This class assists students in creating an onscreen timer display.
+    """
+    
+    def __init__(self, x, y, useScientific=False, timerColor=color.white):
+        
+        # PhysTimer
+        # x,y - world coordinates for the timer location
+        # useScientific - bool to turn off/on scientific notation for time
+        # timerColor - attribute controlling the color of the text
+        
+        try:
+            self.useScientific = useScientific
+            self.timerColor = timerColor
+            if useScientific is False:
+                self.timerLabel = label(pos=vector(x,y,0), text='00:00:00.00', box=False)
+            else:
+                self.timerLabel = label(pos=vector(x,y,0), text='00E01', box=False)
+
+            # Range of times over which the text shown stays the same (empty until the first update)
+            self.tLow = self.tHigh = 0
+            self.scientificShown = useScientific
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def update(self, t):
+        try:
+            # Nothing to do while t is still within the range showing the same text
+            if self.tLow <= t < self.tHigh and self.useScientific == self.scientificShown:
+                return
+
+            # Basically just use sprintf formatting according to either stopwatch or scientific notation;
+            # also work out when the last digit shown will next change
+            if self.useScientific:
+                text = "%.4E" % t
+                mantissa, exponent = text.split("E")
+                step = 10 ** (int(exponent) - 4)
+                nextChange = (int(mantissa.replace(".", "").replace("-", "")) + 0.5) * step
+            else:
+                hours = int(t / 3600)
+                mins = int((t / 60) % 60)
+                secs = int(t % 60)
+                frac = int(round(100 * (t % 1)))
+                step = 0.01
+                nextChange = min(math.floor(t) + 1, math.floor(t) + (frac + 0.5) / 100)
+                if frac == 100:
+                    frac = 0
+                    secs = secs + 1;
+                text = "%02d:%02d:%02d.%02d" % (hours, mins, secs, frac)
+
+            # Changing a label's text is slow to draw, so only do it when it differs
+            if text != self.timerLabel.text:
+                self.timerLabel.text = text
+
+            # The text stays the same until nextChange (allowing a small fraction of the
+            # display step for rounding); negative times are simply redone every update
+            self.tLow = t
+            self.tHigh = nextChange - step * 1e-6 if t > 0 else t
+            self.scientificShown = self.useScientific
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def getState(self):
+        # Displayed text, for saveCheckpoint
+        return {"text": self.timerLabel.text}
+
+    def setState(self, state):
+        self.timerLabel.text = state["text"]
+        self.tLow = self.tHigh = 0
+
+class PhysGraph:
+    """
+    This class assists students in creating graphs with advanced functionality.
+    """ 
+    
+    # Static, pre-determined list of colors from which each line will be generated
+    graphColors = [color.red, color.green, color.blue, color.yellow, 
+                    color.orange, color.cyan, color.magenta, color.white]
+
+    def __init__(self, numPlots=1, maxPoints=None, bufferSize=None):
+        # PhysGraph
+        # numPlots - number of dependent quantities (curves) on the graph
+        # maxPoints - if given, the most points drawn per curve; older history is
+        #             compacted (min/max decimation) so long runs cost the same to plot
+        # bufferSize - if given, samples (numbers only) are collected and sent to the
+        #              curves in bulk every bufferSize samples, or whenever flush() is called
+
+        try:
+            # Create our specific graph window
+            self.graphDisplay = gdisplay(475,350)
+            self.numPlots = numPlots
+            self.maxPoints = maxPoints
+            if maxPoints is not None and maxPoints < 4:
+                raise Exception("ERROR: maxPoints must be at least 4!")
+
+            # Initialize each plot curve
             self.graphs = []
             for i in range(numPlots):
                 self.graphs.append(gcurve(color=PhysGraph.graphColors[i%len(PhysGraph.graphColors)]))
+
+            # Decimation state per curve: completed buckets of drawn (sample number, point)
+            # pairs, the bucket being filled (count, lowest, highest, latest sample), the
+            # number of samples per bucket, and whether flush() drew the unfinished bucket
+            self.numSamples = 0
+            self.buckets = [[] for i in range(numPlots)]
+            self.pending = [None] * numPlots
+            self.bucketSize = [1] * numPlots
+            self.tailDrawn = [False] * numPlots
+
+            # Buffered samples, one row of (independent, dependents...) per sample
+            self.bufferSize = bufferSize
+            if bufferSize is not None:
+                self.buffer = numpy.empty((bufferSize, numPlots + 1))
+            self.numBuffered = 0
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def plot(self, independent, *dependents):
+        try:
+            if len(dependents) != self.numPlots:
+                raise Exception("ERROR: Number of dependent parameters given does not match numPlots given at initialization!")
+
+            if self.bufferSize is None:
+                self.__draw(independent, dependents)
+            else:
+                row = self.buffer[self.numBuffered]
+                row[0] = independent
+                row[1:] = dependents
+                self.numBuffered += 1
+                if self.numBuffered == self.bufferSize:
+                    self.flush()
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def flush(self):
+        # Send any buffered samples to the curves and, with maxPoints, also draw the
+        # bucket still being filled, so the curve reaches the latest sample (call once
+        # per frame and after the loop)
+        if self.numBuffered > 0:
+            samples = self.buffer[:self.numBuffered].tolist()
+            self.numBuffered = 0
+            if self.maxPoints is None:
+                # One call per curve for the whole batch
+                for i in range(self.numPlots):
+                    self.graphs[i].plot(pos=[(sample[0], sample[i+1]) for sample in samples])
+                self.numSamples += len(samples)
+            else:
+                for sample in samples:
+                    self.__draw(sample[0], sample[1:])
+        if self.maxPoints is not None:
+            for i in range(self.numPlots):
+                if self.pending[i] is not None:
+                    self.__redraw(i, True)
+
+    def getState(self):
+        # Buffered samples and decimation history, for saveCheckpoint (points already
+        # sent to a curve without maxPoints are not kept by PhysGraph, so not saved)
+        return {"numSamples": self.numSamples,
+                "buckets": [list(buckets) for buckets in self.buckets],
+                "pending": [list(pending) if pending is not None else None for pending in self.pending],
+                "bucketSize": list(self.bucketSize),
+                "buffer": self.buffer[:self.numBuffered].copy() if self.bufferSize is not None else None}
+
+    def setState(self, state):
+        self.numSamples = state["numSamples"]
+        self.buckets = [list(buckets) for buckets in state["buckets"]]
+        self.pending = [list(pending) if pending is not None else None for pending in state["pending"]]
+        self.bucketSize = list(state["bucketSize"])
+        self.numBuffered = 0
+        if state["buffer"] is not None:
+            self.numBuffered = len(state["buffer"])
+            self.buffer[:self.numBuffered] = state["buffer"]
+        if self.maxPoints is not None:
+            for i in range(self.numPlots):
+                self.__redraw(i)
+
+    def __draw(self, independent, dependents):
+        # Plot each line based on its parameter!
+        for i in range(len(dependents)):
+            if self.maxPoints is None:
+                self.graphs[i].plot(pos=(independent,dependents[i]))
+            else:
+                self.__decimate(i, (independent,dependents[i]))
+        self.numSamples += 1
+
+    def __decimate(self, i, point):
+        # Min/max decimation: each bucket of samples is drawn as its lowest and
+        # highest point, so peaks survive while the number of points stays bounded
+        sample = (self.numSamples, point)
+        pending = self.pending[i]
+        if pending is None:
+            pending = self.pending[i] = [0, sample, sample, sample]
+        pending[0] += 1
+        pending[3] = sample
+        if point[1] < pending[1][1][1]:
+            pending[1] = sample
+        if point[1] > pending[2][1][1]:
+            pending[2] = sample
+        if pending[0] < self.bucketSize[i]:
+            return
+
+        bucket = _minMaxSamples(pending[1:3])
+        self.pending[i] = None
+        self.buckets[i].append(bucket)
+        if 2 * len(self.buckets[i]) <= self.maxPoints and self.tailDrawn[i]:
+            # The unfinished bucket drawn by flush() is replaced by the finished one
+            self.__redraw(i)
+        elif 2 * len(self.buckets[i]) <= self.maxPoints:
+            for sample in bucket:
+                self.graphs[i].plot(pos=sample[1])
+        else:
+            # Over budget: merge neighbouring buckets (halving the points drawn),
+            # double the bucket size from now on, and redraw the curve in one go
+            old = self.buckets[i]
+            self.buckets[i] = [_minMaxSamples(old[j] + old[j+1]) if j + 1 < len(old) else old[j]
+                               for j in range(0, len(old), 2)]
+            self.bucketSize[i] *= 2
+            self.__redraw(i)
+
+    def __redraw(self, i, tail=False):
+        # Replace everything drawn on curve i with the current buckets, followed (if
+        # tail is True) by the lowest, highest and latest samples of the unfinished one
+        points = [sample[1] for bucket in self.buckets[i] for sample in bucket]
+        self.tailDrawn[i] = tail and self.pending[i] is not None
+        if self.tailDrawn[i]:
+            tailSamples = dict((sample[0], sample[1]) for sample in self.pending[i][1:])
+            points += [tailSamples[k] for k in sorted(tailSamples)]
+        if hasattr(self.graphs[i], "gcurve"):
+            # visual.graph keeps the drawn curve itself in gcurve.gcurve
+            self.graphs[i].gcurve.pos = points
+        else:
+            self.graphs[i].visible = False
+            self.graphs[i] = gcurve(color=PhysGraph.graphColors[i%len(PhysGraph.graphColors)])
+            self.graphs[i].plot(pos=points)
+
+def _minMaxSamples(samples):
+    # The lowest and highest of the given (sample number, point) pairs, in sample order
+    low = min(samples, key=lambda sample: sample[1][1])
+    high = max(samples, key=lambda sample: sample[1][1])
+    if low[0] == high[0]:
+        return [low]
+    return sorted([low, high])
+
+class PhysIntegrator:
+    """
+    This class advances the positions and velocities of one or more objects
+    using NumPy arrays instead of per-step vector arithmetic, and only copies
+    the results back to the scene objects when asked to (once per frame).
+    """
+
+    def __init__(self, objs, accel, method="euler-cromer", t=0, pos=None, v=None):
+        # PhysIntegrator
+        # objs - scene object (or list of scene objects) with pos and v to integrate;
+        #        may be None if pos and v are given instead
+        # accel - function accel(t, pos, v) returning the (N, 3) array of accelerations
+        #         (a single vector / 3-tuple is applied to every object)
+        # method - stepping method; see PhysIntegrator.methods for the options
+        # t - starting time
+        # pos, v - (N, 3) initial positions and velocities, used instead of reading objs
+
+        try:
+            if objs is not None and not isinstance(objs, (list, tuple)):
+                objs = [objs]
+            self.objs = objs
+            self.accel = accel
+            self.t = t
+            self.stepCount = 0
+            self.reset()
+
+            # Zero-crossing events being watched, and the crossings found so far
+            self.events = []
+            self.eventLog = []
+            self.stopped = False
+            self._stepA = None
+
+            if method not in PhysIntegrator.methods:
+                raise Exception("ERROR: Unknown integration method '" + str(method) + "'; choose one of " + str(sorted(PhysIntegrator.methods)) + "!")
+            self.method = method
+
+            # State lives in contiguous (N, 3) arrays
+            if pos is None:
+                pos = [[obj.pos.x, obj.pos.y, obj.pos.z] for obj in objs]
+            if v is None:
+                v = [[obj.v.x, obj.v.y, obj.v.z] for obj in objs]
+            self.pos = numpy.array(pos, dtype=float).reshape(-1, 3)
+            self.v = numpy.array(v, dtype=float).reshape(-1, 3)
+            if objs is not None:
+                self.m = numpy.array([getattr(obj, "m", 1.0) for obj in objs], dtype=float)
+            else:
+                self.m = numpy.ones(len(self.pos))
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def acceleration(self, t, pos, v):
+        # Evaluate the user's acceleration function as an array of floats
+        return numpy.asarray(self.accel(t, pos, v), dtype=float)
+
+    def reset(self):
+        # Forget the stored acceleration; call this after changing pos or v by hand
+        self._a = None
+
+    def _stepEuler(self, dt):
+        # Position uses the velocity from the start of the step
+        a = self.acceleration(self.t, self.pos, self.v)
+        self.pos += self.v * dt
+        self.v += a * dt
+
+    def _stepEulerCromer(self, dt):
+        # Position uses the velocity from the end of the step (as in the models)
+        a = self.acceleration(self.t, self.pos, self.v)
+        self.v += a * dt
+        self.pos += self.v * dt
+
+    def _kickDriftKick(self, t, dt):
+        # Half kick, full drift, half kick; the acceleration at the end of one
+        # step is kept for the start of the next, so it costs one evaluation
+        if self._a is None:
+            self._a = self.acceleration(t, self.pos, self.v)
+        self.v += self._a * (dt / 2)
+        self.pos += self.v * dt
+        self._a = self.acceleration(t + dt, self.pos, self.v)
+        self.v += self._a * (dt / 2)
+
+    def _stepVelocityVerlet(self, dt):
+        # Symplectic and 2nd order: energy error stays bounded instead of drifting
+        self._kickDriftKick(self.t, dt)
+
+    # Yoshida's weights for composing three Verlet steps into a 4th order step
+    yoshidaWeights = [1 / (2 - 2 ** (1 / 3)),
+                      -2 ** (1 / 3) / (2 - 2 ** (1 / 3)),
+                      1 / (2 - 2 ** (1 / 3))]
+
+    def _stepYoshida4(self, dt):
+        # Symplectic and 4th order (the middle substep runs backwards in time)
+        t = self.t
+        for w in PhysIntegrator.yoshidaWeights:
+            self._kickDriftKick(t, w * dt)
+            t = t + w * dt
+
+    # Available stepping methods, by name. The symplectic methods ("verlet",
+    # "leapfrog" and "yoshida4") conserve energy far better than Euler-Cromer for
+    # springs and orbits, allowing much larger steps, as long as the acceleration
+    # depends on position only.
+    methods = {
+        "euler": _stepEuler,
+        "euler-cromer": _stepEulerCromer,
+        "verlet": _stepVelocityVerlet,
+        "leapfrog": _stepVelocityVerlet,
+        "yoshida4": _stepYoshida4,
+    }
+
+    def step(self, dt):
+        # Advance the state by a single time step dt (the scene is not updated);
+        # does nothing once a terminal event has stopped the integration
+        if self.stopped:
+            return
+        self.lastPos, self.lastV, self.lastT = self.pos.copy(), self.v.copy(), self.t
+        PhysIntegrator.methods[self.method](self, dt)
+        self.t = self.t + dt
+        self.stepCount += 1
+        self._stepA = None
+        self._checkEvents()
+
+    def advance(self, dt, numSteps=1):
+        # Advance the state by numSteps steps of size dt (or until a terminal
+        # event), then update the scene
+        try:
+            for i in range(numSteps):
+                if self.stopped:
+                    break
+                self.step(dt)
+            self.sync()
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def addEvent(self, function, direction=0, terminal=True):
+        # Watch for function(t, pos, v) crossing zero; the time of each crossing is
+        # found within the step (rather than at the end of it) and logged in
+        # eventLog as (t, eventNumber). Returns the event's number.
+        # function - returns a number that changes sign at the event, e.g. the
+        #            height of a ball: lambda t, pos, v: pos[0, 1]
+        # direction - only count crossings where the function is rising (1),
+        #             falling (-1), or either (0)
+        # terminal - stop the integration at the crossing (stopped becomes True
+        #            and the state is left exactly at the event)
+        try:
+            self.events.append([function, direction, terminal, function(self.t, self.pos, self.v)])
+            return len(self.events) - 1
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def _stepAccelerations(self):
+        # Accelerations at the start and end of the last step, for interpolate
+        if self._stepA is None:
+            self._stepA = (self.acceleration(self.lastT, self.lastPos, self.lastV),
+                           self.acceleration(self.t, self.pos, self.v))
+        return self._stepA
+
+    def interpolate(self, t):
+        # Position and velocity at a time t within the last step, from the quintic
+        # through the positions, velocities and accelerations at both ends
+        h = self.t - self.lastT
+        s = (t - self.lastT) / h
+        a0, a1 = self._stepAccelerations()
+        pos = ((1 - 10 * s ** 3 + 15 * s ** 4 - 6 * s ** 5) * self.lastPos
+               + (s - 6 * s ** 3 + 8 * s ** 4 - 3 * s ** 5) * h * self.lastV
+               + (s ** 2 - 3 * s ** 3 + 3 * s ** 4 - s ** 5) / 2 * h ** 2 * a0
+               + (s ** 3 - 2 * s ** 4 + s ** 5) / 2 * h ** 2 * a1
+               + (-4 * s ** 3 + 7 * s ** 4 - 3 * s ** 5) * h * self.v
+               + (10 * s ** 3 - 15 * s ** 4 + 6 * s ** 5) * self.pos)
+        v = ((-30 * s ** 2 + 60 * s ** 3 - 30 * s ** 4) / h * self.lastPos
+             + (1 - 18 * s ** 2 + 32 * s ** 3 - 15 * s ** 4) * self.lastV
+             + (2 * s - 9 * s ** 2 + 12 * s ** 3 - 5 * s ** 4) / 2 * h * a0
+             + (3 * s ** 2 - 8 * s ** 3 + 5 * s ** 4) / 2 * h * a1
+             + (-12 * s ** 2 + 28 * s ** 3 - 15 * s ** 4) * self.v
+             + (30 * s ** 2 - 60 * s ** 3 + 30 * s ** 4) / h * self.pos)
+        return pos, v
+
+    def _eventTime(self, function, g0, g1):
+        # Time within the last step at which function crosses zero (Illinois method)
+        t0, t1 = self.lastT, self.t
+        tNew = t1
+        for i in range(100):
+            tOld = tNew
+            tNew = t1 - g1 * (t1 - t0) / (g1 - g0)
+            gNew = function(tNew, *self.interpolate(tNew))
+            if gNew == 0 or abs(tNew - tOld) <= 1e-12 * max(abs(t1 - t0), abs(tNew)):
+                break
+            if (gNew > 0) == (g1 > 0):
+                g0 = g0 / 2
+            else:
+                t0, g0 = t1, g1
+            t1, g1 = tNew, gNew
+        return tNew
+
+    def _checkEvents(self):
+        # Look for crossings during the step just taken; log them in time order and
+        # stop at the first terminal one
+        crossings = []
+        for i in range(len(self.events)):
+            function, direction, terminal, g0 = self.events[i]
+            g1 = function(self.t, self.pos, self.v)
+            rising = g0 < 0 and g1 >= 0
+            falling = g0 > 0 and g1 <= 0
+            if (rising and direction >= 0) or (falling and direction <= 0):
+                crossings.append((self._eventTime(function, g0, g1), i))
+            self.events[i][3] = g1
+        for tEvent, i in sorted(crossings):
+            self.eventLog.append((tEvent, i))
+            if self.events[i][2]:
+                # The last step now ends at the event
+                a0 = self._stepAccelerations()[0]
+                self.pos, self.v = self.interpolate(tEvent)
+                self.t = tEvent
+                self.reset()
+                self._stepA = (a0, self.acceleration(self.t, self.pos, self.v))
+                self.stopped = True
+                for event in self.events:
+                    event[3] = event[0](self.t, self.pos, self.v)
+                break
+
+    def getState(self):
+        # Time, state arrays and stored acceleration, for saveCheckpoint
+        return {"t": self.t, "stepCount": self.stepCount, "method": self.method,
+                "pos": self.pos.copy(), "v": self.v.copy(), "m": self.m.copy(),
+                "a": self._a.copy() if self._a is not None else None,
+                "eventLog": list(self.eventLog), "stopped": self.stopped}
+
+    def setState(self, state):
+        # Restore a saved state and move the scene objects to match
+        self.t = state["t"]
+        self.stepCount = state["stepCount"]
+        self.method = state["method"]
+        self.pos = state["pos"].copy()
+        self.v = state["v"].copy()
+        self.m = state["m"].copy()
+        self._a = state["a"].copy() if state["a"] is not None else None
+        self.eventLog = list(state["eventLog"])
+        self.stopped = state["stopped"]
+        for event in self.events:
+            event[3] = event[0](self.t, self.pos, self.v)
+        self.sync()
+
+    def sync(self):
+        # Copy the current positions and velocities back to the scene objects
+        if self.objs is None:
+            return
+        for i in range(len(self.objs)):
+            self.objs[i].pos = vector(self.pos[i, 0], self.pos[i, 1], self.pos[i, 2])
+            self.objs[i].v = vector(self.v[i, 0], self.v[i, 1], self.v[i, 2])
+
+class PhysEnsemble(PhysIntegrator):
+    """
+    This class runs many independent copies of a model at once (one row of the
+    (N, 3) state arrays per parameter set), so a whole sweep of launch angles,
+    speeds, etc. is a single array calculation instead of one run per variant.
+    """
+
+    def __init__(self, pos, v, accel, running=None, method="euler-cromer", t=0):
+        # PhysEnsemble
+        # pos, v - initial positions and velocities of the members; (N, 3) arrays, or a
+        #          single 3-vector shared by every member
+        # accel - function accel(t, pos, v) returning the (N, 3) array of accelerations
+        # running - function running(t, pos, v) returning an (N,) array of booleans; each
+        #           member stops as soon as its entry is False (the model's while condition)
+        # method - stepping method; see PhysIntegrator.methods for the options
+        # t - starting time
+
+        try:
+            pos, v = numpy.broadcast_arrays(numpy.array(pos, dtype=float).reshape(-1, 3),
+                                            numpy.array(v, dtype=float).reshape(-1, 3))
+            PhysIntegrator.__init__(self, None, accel, method=method, t=t, pos=pos, v=v)
+            self.running = running
+            self.numMembers = len(self.pos)
+
+            # Which members are still being integrated, and when / where each one stopped
+            self.active = numpy.ones(self.numMembers, dtype=bool)
+            self.posFinal = self.pos.copy()
+            self.vFinal = self.v.copy()
+            self.tFinal = numpy.empty(self.numMembers)
+            self.tFinal.fill(numpy.nan)
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def step(self, dt):
+        PhysIntegrator.step(self, dt)
+
+        # Stopped members are put back to the state they stopped in
+        frozen = ~self.active
+        if frozen.any():
+            self.pos[frozen] = self.posFinal[frozen]
+            self.v[frozen] = self.vFinal[frozen]
+
+    def getState(self):
+        state = PhysIntegrator.getState(self)
+        state.update({"active": self.active.copy(), "tFinal": self.tFinal.copy(),
+                      "posFinal": self.posFinal.copy(), "vFinal": self.vFinal.copy()})
+        return state
+
+    def setState(self, state):
+        PhysIntegrator.setState(self, state)
+        self.numMembers = len(self.pos)
+        self.active = state["active"].copy()
+        self.tFinal = state["tFinal"].copy()
+        self.posFinal = state["posFinal"].copy()
+        self.vFinal = state["vFinal"].copy()
+
+    def run(self, dt, tMax=None):
+        # Advance every member until its running condition fails (or until tMax)
+        try:
+            if self.running is None and tMax is None:
+                raise Exception("ERROR: PhysEnsemble.run needs either a running condition or tMax!")
+
+            while True:
+                if self.running is not None:
+                    stopped = self.active & ~numpy.asarray(self.running(self.t, self.pos, self.v), dtype=bool)
+                    self.tFinal[stopped] = self.t
+                    self.posFinal[stopped] = self.pos[stopped]
+                    self.vFinal[stopped] = self.v[stopped]
+                    self.active &= ~stopped
+                if not self.active.any():
+                    break
+                if tMax is not None and self.t >= tMax:
+                    self.tFinal[self.active] = self.t
+                    self.posFinal[self.active] = self.pos[self.active]
+                    self.vFinal[self.active] = self.v[self.active]
+                    break
+                self.step(dt)
+            return self
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+class PhysLaunchSolver:
+    """
+    This class finds the launch angle that lands a projectile at a target range
+    by root finding on the simulated range, instead of re-running the model for
+    every angle in small increments.
+    """
+
+    def __init__(self, speed, startPos=(0, 0, 0), accel=None, g=(0, -9.8, 0), deltat=0.001, groundY=0):
+        # PhysLaunchSolver
+        # speed - launch speed
+        # startPos - launch position (range is measured from its x coordinate)
+        # accel - function accel(t, pos, v) for the projectile; defaults to constant g
+        # g - acceleration due to gravity, used when accel is not given
+        # deltat - time step for each simulated flight
+        # groundY - a flight ends once the projectile's y-position drops below this
+
+        try:
+            self.speed = speed
+            self.startPos = numpy.array(startPos, dtype=float)
+            self.g = numpy.array(g, dtype=float)
+            self.accel = accel if accel is not None else (lambda t, pos, v: self.g)
+            self.deltat = deltat
+            self.groundY = groundY
+
+            # Landing state (t, pos, v) of every angle simulated so far, keyed by angle
+            self.cache = {}
+            self.numIntegrations = 0
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def land(self, theta):
+        # Simulate (or look up) the flight for launch angle theta, in degrees
+        if theta not in self.cache:
+            v = self.speed * numpy.array([math.cos(math.radians(theta)), math.sin(math.radians(theta)), 0])
+            flight = PhysEnsemble(self.startPos, v, self.accel,
+                        running=lambda t, pos, v: pos[:, 1] >= self.groundY).run(self.deltat)
+            self.cache[theta] = (flight.tFinal[0], flight.pos[0].copy(), flight.v[0].copy())
+            self.numIntegrations += 1
+        return self.cache[theta]
+
+    def range(self, theta):
+        # Horizontal distance travelled for launch angle theta, in degrees
+        return self.land(theta)[1][0] - self.startPos[0]
+
+    def solve(self, targetRange, tolerance=0.04, thetaMin=0, thetaMax=90, bracketStep=10, maxIntegrations=50):
+        # Returns the first angle above thetaMin (in degrees) whose range is within
+        # tolerance of targetRange, simulating at most maxIntegrations new flights;
+        # see numIntegrations for the number of flights simulated over all solves
+        try:
+            startIntegrations = self.numIntegrations
+            # Bracket: coarse steps until the range crosses the target
+            a = thetaMin
+            fa = self.range(a) - targetRange
+            if abs(fa) <= tolerance:
+                return a
+            samples = [(a, fa)]
+            while True:
+                b = min(a + bracketStep, thetaMax)
+                fb = self.range(b) - targetRange
+                samples.append((b, fb))
+                if abs(fb) <= tolerance:
+                    return b
+                if fa * fb < 0:
+                    break
+                if b >= thetaMax:
+                    # Every sample falls on the same side of the target, which can still be
+                    # reached near the best one (e.g. just short of the maximum range)
+                    a, fa, b, fb = self.__bracketExtremum(samples, targetRange, tolerance, thetaMin, thetaMax,
+                                                          bracketStep, startIntegrations + maxIntegrations)
+                    if abs(fb) <= tolerance:
+                        return b
+                    break
+                a, fa = b, fb
+
+            # Refine: false position (Illinois variant), which keeps the root bracketed
+            # while converging about as fast as the secant method
+            while self.numIntegrations - startIntegrations < maxIntegrations:
+                c = (a * fb - b * fa) / (fb - fa)
+                fc = self.range(c) - targetRange
+                if abs(fc) <= tolerance:
+                    return c
+                if fc * fb < 0:
+                    a, fa = b, fb
+                else:
+                    fa = fa / 2
+                b, fb = c, fc
+            raise Exception("ERROR: Launch angle did not converge within maxIntegrations simulations!")
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def __bracketExtremum(self, samples, targetRange, tolerance, thetaMin, thetaMax, bracketStep, maxIntegrations):
+        # Golden-section search for the largest (or, if every sample overshoots, the
+        # smallest) range around the best sample, stopping as soon as the range crosses
+        # the target; returns a bracket (a, fa, b, fb) with b past the target, or with b
+        # within tolerance of it if the range only ever gets that close
+        best, fBest = min(samples, key=lambda sample: abs(sample[1]))
+        direction = 1 if fBest < 0 else -1
+        low = max(thetaMin, best - bracketStep)
+        high = min(thetaMax, best + bracketStep)
+        ratio = (math.sqrt(5) - 1) / 2
+        c = high - ratio * (high - low)
+        d = low + ratio * (high - low)
+        fc = self.range(c) - targetRange
+        fd = self.range(d) - targetRange
+        samples += [(c, fc), (d, fd)]
+        while True:
+            for b, fb in sorted([(c, fc), (d, fd)]):
+                if fb * fBest < 0:
+                    # Crossed: the first root lies between b and the sample before it
+                    a, fa = max(sample for sample in samples if sample[0] < b and sample[1] * fBest > 0)
+                    return a, fa, b, fb
+            if high - low < 1e-3 or self.numIntegrations >= maxIntegrations:
+                close = [sample for sample in samples if abs(sample[1]) <= tolerance]
+                if close:
+                    return min(close) + min(close)
+                raise Exception("ERROR: No launch angle between thetaMin and thetaMax reaches targetRange!")
+            if direction * fc > direction * fd:
+                high, d, fd = d, c, fc
+                c = high - ratio * (high - low)
+                fc = self.range(c) - targetRange
+                samples.append((c, fc))
+            else:
+                low, c, fc = c, d, fd
+                d = low + ratio * (high - low)
+                fd = self.range(d) - targetRange
+                samples.append((d, fd))
+
+class PhysAdaptiveIntegrator(PhysIntegrator):
+    """
+    This class advances positions and velocities with the Dormand-Prince (RK45)
+    method, choosing each time step so the estimated error stays within the
+    given tolerances: large steps where the motion is gentle, small steps during
+    close approaches.
+    """
+
+    # Dormand-Prince coefficients: stage times, stage weights and the difference
+    # between the 5th and 4th order solutions (used as the error estimate)
+    stageC = [0, 1/5, 3/10, 4/5, 8/9, 1, 1]
+    stageA = [[],
+              [1/5],
+              [3/40, 9/40],
+              [44/45, -56/15, 32/9],
+              [19372/6561, -25360/2187, 64448/6561, -212/729],
+              [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+              [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]]
+    errorE = [71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40]
+
+    def __init__(self, objs, accel, rtol=1e-6, atol=1e-6, dt=None, dtMin=0, dtMax=None, t=0, pos=None, v=None):
+        # PhysAdaptiveIntegrator
+        # objs - scene object (or list of scene objects) with pos and v to integrate;
+        #        may be None if pos and v are given instead
+        # accel - function accel(t, pos, v) returning the (N, 3) array of accelerations
+        # rtol, atol - relative and absolute error allowed per step (for pos and v)
+        # dt - first time step to try; estimated from the initial state by default
+        # dtMin, dtMax - limits on the time step (dtMin steps are accepted regardless of error)
+        # t - starting time
+        # pos, v - (N, 3) initial positions and velocities, used instead of reading objs
+
+        PhysIntegrator.__init__(self, objs, accel, t=t, pos=pos, v=v)
+        try:
+            self.method = "dormand-prince"
+            self.rtol = rtol
+            self.atol = atol
+            self.dtMin = dtMin
+            self.dtMax = dtMax if dtMax is not None else float("inf")
+            self.rejectedCount = 0
+            self.dt = dt if dt is not None else self._initialStep()
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def _errorNorm(self, errPos, errV, posNew, vNew):
+        scalePos = self.atol + self.rtol * numpy.maximum(numpy.abs(self.pos), numpy.abs(posNew))
+        scaleV = self.atol + self.rtol * numpy.maximum(numpy.abs(self.v), numpy.abs(vNew))
+        return math.sqrt((numpy.sum((errPos / scalePos) ** 2) + numpy.sum((errV / scaleV) ** 2)) / (2 * self.pos.size))
+
+    def _initialStep(self):
+        # Rough first guess: 1% of the time the state takes to change by its own size
+        a = self.acceleration(self.t, self.pos, self.v)
+        scalePos = self.atol + self.rtol * numpy.abs(self.pos)
+        scaleV = self.atol + self.rtol * numpy.abs(self.v)
+        d0 = math.sqrt(numpy.sum((self.pos / scalePos) ** 2) + numpy.sum((self.v / scaleV) ** 2))
+        d1 = math.sqrt(numpy.sum((self.v / scalePos) ** 2) + numpy.sum((a / scaleV) ** 2))
+        dt = 0.01 * d0 / d1 if (d0 > 1e-5 and d1 > 1e-5) else 1e-6
+        return min(max(dt, self.dtMin), self.dtMax)
+
+    def _attempt(self, dt):
+        # One Dormand-Prince step of size dt from the current state (nothing is stored)
+        if self._a is None:
+            self._a = self.acceleration(self.t, self.pos, self.v)
+        kPos = [self.v]
+        kV = [self._a]
+        for i in range(1, 7):
+            stagePos = self.pos.copy()
+            stageV = self.v.copy()
+            for j in range(i):
+                if PhysAdaptiveIntegrator.stageA[i][j] != 0:
+                    stagePos += (dt * PhysAdaptiveIntegrator.stageA[i][j]) * kPos[j]
+                    stageV += (dt * PhysAdaptiveIntegrator.stageA[i][j]) * kV[j]
+            kPos.append(stageV)
+            kV.append(self.acceleration(self.t + PhysAdaptiveIntegrator.stageC[i] * dt, stagePos, stageV))
+
+        # The last stage is evaluated at the new (5th order) solution
+        errPos = numpy.zeros_like(self.pos)
+        errV = numpy.zeros_like(self.v)
+        for j in range(7):
+            if PhysAdaptiveIntegrator.errorE[j] != 0:
+                errPos += (dt * PhysAdaptiveIntegrator.errorE[j]) * kPos[j]
+                errV += (dt * PhysAdaptiveIntegrator.errorE[j]) * kV[j]
+        return stagePos, stageV, kPos, kV, self._errorNorm(errPos, errV, stagePos, stageV)
+
+    def step(self, dt):
+        # Advance the state by dt (the scene is not updated), in as many adaptive
+        # steps as the tolerances need; does nothing once a terminal event has
+        # stopped the integration
+        tEnd = self.t + dt
+        while tEnd - self.t > 1e-12 * max(1, abs(tEnd)) and not self.stopped:
+            self.adaptiveStep(tEnd)
+
+    def adaptiveStep(self, tEnd=None):
+        # Take one accepted step of the integrator's own choosing (not past tEnd,
+        # if given) and return its size
+        if self.stopped:
+            return 0
+        while True:
+            dt = min(self.dt, self.dtMax)
+            clipped = tEnd is not None and self.t + dt > tEnd
+            if clipped:
+                dt = tEnd - self.t
+            posNew, vNew, kPos, kV, err = self._attempt(dt)
+
+            # Standard step size controller for a 5th order method
+            factor = 5 if err == 0 else min(5, max(0.2, 0.9 * err ** -0.2))
+            if err <= 1 or dt <= self.dtMin:
+                self.lastPos, self.lastV, self.lastT = self.pos, self.v, self.t
+                self.kPos, self.kV = kPos, kV
+                self.pos, self.v = posNew, vNew
+                self._a = kV[6]
+                self._stepA = None
+                self.t = tEnd if clipped else self.t + dt
+                self.stepCount += 1
+                if not clipped:
+                    self.dt = max(dt * factor, self.dtMin)
+                self._checkEvents()
+                return self.t - self.lastT
+            self.dt = max(dt * factor, self.dtMin)
+            self.rejectedCount += 1
+
+    def _stepAccelerations(self):
+        # The first and last Dormand-Prince stages are already the accelerations at both ends
+        if self._stepA is None:
+            self._stepA = (self.kV[0], self.kV[6])
+        return self._stepA
+
+    def getState(self):
+        state = PhysIntegrator.getState(self)
+        state.update({"dt": self.dt, "rejectedCount": self.rejectedCount})
+        return state
+
+    def setState(self, state):
+        PhysIntegrator.setState(self, state)
+        self.dt = state["dt"]
+        self.rejectedCount = state["rejectedCount"]
+
+    def advance(self, dt, numSteps=1):
+        # Advance by a total time of dt * numSteps, using as many adaptive steps as needed
+        self.advanceTo(self.t + dt * numSteps)
+
+    def advanceTo(self, tEnd):
+        # Step until the time reaches tEnd exactly, then update the scene
+        try:
+            self.step(tEnd - self.t)
+            self.sync()
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+class PhysTrail:
+    """
+    This class assists students in drawing an object's trail without it growing
+    forever: only the most recent points are kept (in a ring buffer) and drawn.
+    """
+
+    def __init__(self, maxLength=1000, epsilon=0, color=color.yellow, radius=None):
+        # PhysTrail
+        # maxLength - most points kept and drawn; the oldest points are dropped first
+        # epsilon - skip points closer than this to the previous point (0 keeps every point)
+        # color - color of the trail
+        # radius - thickness of the trail (defaults to a thin line)
+
+        try:
+            self.maxLength = int(maxLength)
+            self.epsilon = epsilon
+            self.color = color
+            self.radius = radius
+            if radius is None:
+                self.curve = curve(color=color)
+            else:
+                self.curve = curve(color=color, radius=radius)
+
+            # Ring buffer of points; the oldest is at self.start
+            self.points = numpy.zeros((self.maxLength, 3))
+            self.start = 0
+            self.numPoints = 0
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def append(self, pos):
+        # Add a point to the end of the trail; returns False if it was skipped
+        try:
+            if self.epsilon > 0 and self.numPoints > 0:
+                last = self.points[(self.start + self.numPoints - 1) % self.maxLength]
+                if (pos[0]-last[0])**2 + (pos[1]-last[1])**2 + (pos[2]-last[2])**2 < self.epsilon**2:
+                    return False
+
+            if self.numPoints < self.maxLength:
+                self.points[(self.start + self.numPoints) % self.maxLength] = (pos[0], pos[1], pos[2])
+                self.numPoints += 1
+            else:
+                self.points[self.start] = (pos[0], pos[1], pos[2])
+                self.start = (self.start + 1) % self.maxLength
+
+            # retain makes the curve drop its oldest point once it is full
+            self.curve.append(pos=pos, retain=self.maxLength)
+            return True
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def positions(self):
+        # The kept points as an (n, 3) array, oldest first
+        return numpy.roll(self.points, -self.start, axis=0)[:self.numPoints]
+
+    def clear(self):
+        # Remove every point from the trail
+        self.start = 0
+        self.numPoints = 0
+        self.curve.pos = []
+
+    def getState(self):
+        # Kept points, for saveCheckpoint
+        return {"points": self.positions().copy()}
+
+    def setState(self, state):
+        # Restore the saved points and redraw the trail
+        self.start = 0
+        self.numPoints = min(len(state["points"]), self.maxLength)
+        self.points[:self.numPoints] = state["points"][len(state["points"]) - self.numPoints:]
+        self.curve.pos = [tuple(point) for point in self.positions()]
+
+class PhysRecorder:
+    """
+    This class assists students in saving the state of their model at every step
+    (time, positions, velocities, energies, forces...) to a .npy file, writing it
+    in chunks so the whole history never has to sit in Python lists. Load the
+    result with numpy.load(filename) (add mmap_mode="r" for very long runs); each
+    field is a column, e.g. data["t"] or data["pos"].
+    """
+
+    def __init__(self, filename, fields, chunkSize=10000):
+        # PhysRecorder
+        # filename - .npy file to write (overwritten if it exists)
+        # fields - names of the quantities recorded each step, in the order given to
+        #          record(); use (name, 3) for vectors, e.g. ["t", ("pos", 3), ("v", 3), "KE"]
+        # chunkSize - number of steps held in memory before they are written to the file
+
+        try:
+            self.filename = filename
+            self.fields = [field if isinstance(field, tuple) else (field, 1) for field in fields]
+            self.dtype = numpy.dtype([(name, "<f8") if size == 1 else (name, "<f8", (size,))
+                                      for name, size in self.fields])
+            self.chunkSize = chunkSize
+            self.chunk = numpy.zeros(chunkSize, dtype=self.dtype)
+            self.numBuffered = 0
+            self.numRecords = 0
+
+            # Reserve room for the largest header we could need, so the row count
+            # can be written over it each time steps are written to the file
+            self.file = open(filename, "wb")
+            self.headerSize = len(_npyHeader(self.dtype, 10**15))
+            self.file.write(_npyHeader(self.dtype, 0, self.headerSize))
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def record(self, *values):
+        # Store one step; values are given in the same order as fields
+        try:
+            if len(values) != len(self.fields):
+                raise Exception("ERROR: Number of values given does not match the number of fields given at initialization!")
+
+            row = self.chunk[self.numBuffered]
+            for i in range(len(values)):
+                name, size = self.fields[i]
+                if size == 1:
+                    row[name] = values[i]
+                else:
+                    row[name] = [values[i][j] for j in range(size)]
+            self.numBuffered += 1
+            if self.numBuffered == self.chunkSize:
+                self.flush()
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def flush(self):
+        # Append the buffered steps to the file and update its row count, so the file
+        # holds everything written so far even if the run never reaches close()
+        if self.numBuffered > 0:
+            self.file.write(self.chunk[:self.numBuffered].tobytes())
+            self.numRecords += self.numBuffered
+            self.numBuffered = 0
+            self.file.seek(0)
+            self.file.write(_npyHeader(self.dtype, self.numRecords, self.headerSize))
+            self.file.seek(0, 2)
+            self.file.flush()
+
+    def close(self):
+        # Write any remaining steps; call once after the loop
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+
+def _npyHeader(dtype, numRows, size=None):
+    # .npy header for a 1-d array of numRows records, padded with spaces to size bytes
+    # (or to the next multiple of 64 bytes)
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+        numpy.lib.format.dtype_to_descr(dtype), numRows)
+    if size is None:
+        size = 64 * ((10 + len(header) + 1 + 63) // 64)
+    header = header + " " * (size - 10 - len(header) - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+class PhysReplay:
+    """
+    This class assists students in watching a recorded run (see PhysRecorder)
+    again at any speed, with seeking and scrubbing, without redoing the physics.
+    It moves the object and drives the attached timers, trails, graphs and
+    motion maps from the recorded data.
+    """
+
+    def __init__(self, data, obj, tField="t", posField="pos"):
+        # PhysReplay
+        # data - .npy file written by PhysRecorder, or the array loaded from one
+        # obj - scene object moved to each recorded position
+        # tField - name of the recorded time field
+        # posField - name of the recorded position field (a vector field)
+
+        try:
+            if isinstance(data, str):
+                data = numpy.load(data, mmap_mode="r")
+            self.data = data
+            self.obj = obj
+            self.times = numpy.asarray(data[tField])
+            self.positions = numpy.asarray(data[posField])
+            self.numRecords = len(self.times)
+
+            self.timers = []
+            self.trails = []
+            self.graphs = []
+            self.motionMaps = []
+            self.index = -1
+
+            # Furthest record already fed to the graphs and motion maps
+            self.fedIndex = -1
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def addTimer(self, timer):
+        # timer - PhysTimer showing the recorded time
+        self.timers.append(timer)
+
+    def addTrail(self, trail):
+        # trail - PhysTrail or curve following the recorded positions
+        self.trails.append(trail)
+
+    def addGraph(self, graph, independentField, *dependentFields):
+        # graph - PhysGraph plotting the given recorded fields (scalar fields)
+        self.graphs.append((graph, independentField, dependentFields))
+
+    def addMotionMap(self, motionMap, quantityField=None):
+        # motionMap - MotionMap or MotionMapN, with markers scaled by quantityField if given
+        self.motionMaps.append((motionMap, quantityField))
+
+    def show(self, index):
+        # Display record number index. Timers, trails and the object always follow;
+        # graphs and motion maps receive each record the first time it is passed over,
+        # so scrubbing back and forth does not draw anything twice
+        try:
+            index = max(0, min(int(index), self.numRecords - 1))
+            t = float(self.times[index])
+            self.obj.pos = self.__vector(self.positions[index])
+            for timer in self.timers:
+                timer.update(t)
+            for trail in self.trails:
+                self.__updateTrail(trail, index)
+            start = self.fedIndex + 1
+            for i in range(start, index + 1):
+                for graph, independentField, dependentFields in self.graphs:
+                    graph.plot(float(self.data[independentField][i]),
+                               *[float(self.data[field][i]) for field in dependentFields])
+            if index >= start:
+                # Markers go where the object was at each record, not where it is now
+                for motionMap, quantityField in self.motionMaps:
+                    quantities = None if quantityField is None else self.data[quantityField][start:index + 1]
+                    motionMap.markTrajectory(self.times[start:index + 1], self.positions[start:index + 1], quantities)
+            self.fedIndex = max(self.fedIndex, index)
+            self.index = index
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def step(self, numRecords=1):
+        # Scrub forward (or backward, if negative) by a number of records
+        self.show(self.index + numRecords)
+
+    def seek(self, t):
+        # Jump to the last record at or before time t
+        self.show(numpy.searchsorted(self.times, t, side="right") - 1)
+
+    def play(self, speed=1, fps=60, tEnd=None):
+        # Play from the current record to tEnd (or the end), covering speed seconds
+        # of recorded time per second of real time, with fps frames per second
+        if self.index < 0:
+            self.show(0)
+        tEnd = self.times[-1] if tEnd is None else tEnd
+        t = self.times[self.index]
+        while t < tEnd and self.index < self.numRecords - 1:
+            rate(fps)
+            t = min(t + speed / fps, tEnd)
+            self.seek(t)
+
+    def __updateTrail(self, trail, index):
+        if index > self.index:
+            # Forward: add the positions passed over since the last frame
+            start = self.index + 1
+            if hasattr(trail, "maxLength"):
+                start = max(start, index + 1 - trail.maxLength)
+            for i in range(start, index + 1):
+                trail.append(pos=self.__vector(self.positions[i]))
+        elif index < self.index:
+            # Backward: rebuild the trail up to this record
+            if hasattr(trail, "maxLength"):
+                trail.clear()
+                for i in range(max(0, index + 1 - trail.maxLength), index + 1):
+                    trail.append(pos=self.__vector(self.positions[i]))
+            else:
+                trail.pos = [self.__vector(self.positions[i]) for i in range(index + 1)]
+
+    def __vector(self, row):
+        return vector(float(row[0]), float(row[1]), float(row[2]))
+
+def saveCheckpoint(filename, **parts):
+    """
+    Saves the state of the given physutil objects (integrators, motion maps,
+    graphs, trails, timers) and plain values such as t to filename, so a long
+    run can be resumed, or branched, with loadCheckpoint. For example:
+        saveCheckpoint("warmup.pkl", t=t, integrator=integrator, trail=trail)
+    """
+    state = {}
+    for name in parts:
+        state[name] = parts[name].getState() if hasattr(parts[name], "getState") else parts[name]
+    checkpointFile = open(filename, "wb")
+    try:
+        pickle.dump(state, checkpointFile, 2)
+    finally:
+        checkpointFile.close()
+
+def loadCheckpoint(filename, **parts):
+    """
+    Restores the given physutil objects from a file written by saveCheckpoint,
+    matching them by name, and returns everything that was saved (so plain
+    values come back too). The objects must be set up the same way as when the
+    checkpoint was saved. For example:
+        t = loadCheckpoint("warmup.pkl", integrator=integrator, trail=trail)["t"]
+    """
+    checkpointFile = open(filename, "rb")
+    try:
+        state = pickle.load(checkpointFile)
+    finally:
+        checkpointFile.close()
+    for name in parts:
+        if name not in state:
+            raise Exception("ERROR: The checkpoint has nothing saved under the name '" + name + "'!")
+        parts[name].setState(state[name])
+    return state
+
+def sweep(model, grid, processes=None, csvFile=None):
+    """
+    Runs a model headless once for every combination of parameter values in grid,
+    spread over a pool of processes, and returns a results table: one dict per
+    run holding the parameters plus whatever the model printed. Printed lines of
+    the form "label: value" become columns named by their label; other lines
+    become "output1", "output2", ... A failed run gets an "error" column.
+
+    grid maps the name of a top-level assignment in the model to the values to
+    try. Each value replaces the right-hand side of the first unindented
+    assignment to that name; strings are inserted as Python code. For example:
+        sweep("inclinedPlane54.py", {"theta": ["20 * pi / 180", "30 * pi / 180"],
+                                     "mu": [0.1, 0.2], "cart.v.mag": [2, 3]})
+    """
+    names = sorted(grid)
+    tasks = [(os.path.abspath(model), dict(zip(names, values)))
+             for values in itertools.product(*[grid[name] for name in names])]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        outputs = pool.map(_runSweepPoint, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = []
+    for (path, params), output in zip(tasks, outputs):
+        row = dict(params)
+        row.update(output)
+        results.append(row)
+
+    if csvFile is not None:
+        _writeCsv(csvFile, names, results)
+    return results
+
+def _overrideParameters(source, params):
+    # Replace the first unindented assignment to each parameter
+    for name in params:
+        value = params[name] if isinstance(params[name], str) else repr(params[name])
+        pattern = re.compile(r"^" + re.escape(name) + r"[ \t]*=(?!=)[^\n]*$", re.MULTILINE)
+        source, count = pattern.subn(lambda match: name + " = " + value, source, 1)
+        if count == 0:
+            raise Exception("ERROR: The model has no top-level assignment to '" + name + "'!")
+    return source
+
+def _parseOutput(text):
+    # Turn printed lines into columns, converting numbers and vectors where possible
+    output = {}
+    numUnlabelled = 0
+    for line in text.splitlines():
+        if line.strip() == "":
+            continue
+        if ":" in line:
+            label, value = line.split(":", 1)
+            label = label.strip()
+        else:
+            numUnlabelled += 1
+            label, value = "output" + str(numUnlabelled), line
+        value = value.strip()
+        try:
+            if value.startswith("<") and value.endswith(">"):
+                value = tuple(float(part) for part in value[1:-1].split(","))
+            else:
+                value = float(value)
+        except ValueError:
+            pass
+        output[label] = value
+    return output
+
+def _runSweepPoint(task):
+    # Runs in a worker process: one headless run of the model with the given parameters
+    path, params = task
+    os.environ["PHYSUTIL_HEADLESS"] = "1"
+    _installHeadlessVisual()
+    if not getattr(sys.modules.get("physutil"), "headless", True):
+        del sys.modules["physutil"]
+
+    # The model's own folder comes first, but it can always find this physutil
+    sys.path.insert(0, os.path.dirname(path))
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    stdout = sys.stdout
+    sys.stdout = captured = StringIO()
+    try:
+        modelFile = open(path)
+        try:
+            source = _overrideParameters(modelFile.read(), params)
+        finally:
+            modelFile.close()
+        exec(compile(source, path, "exec"), {"__name__": "__main__", "__file__": path})
+        error = None
+    except Exception as err:
+        error = repr(err)
+    finally:
+        sys.stdout = stdout
+        sys.path.remove(os.path.dirname(path))
+
+    output = _parseOutput(captured.getvalue())
+    if error is not None:
+        output["error"] = error
+    return output
+
+def _writeCsv(csvFile, names, results):
+    columns = list(names)
+    for row in results:
+        for column in sorted(row):
+            if column not in columns:
+                columns.append(column)
+    if sys.version_info[0] < 3:
+        outFile = open(csvFile, "wb")
+    else:
+        outFile = open(csvFile, "w", newline="")
+    try:
+        writer = csv.writer(outFile)
+        writer.writerow(columns)
+        for row in results:
+            writer.writerow([row.get(column, "") for column in columns])
+    finally:
+        outFile.close()
+
+def gravityAcceleration(pos, m, G=6.673e-11, softening=0, dtype=numpy.float64):
+    """
+    Returns the gravitational acceleration of every body due to all the others
+    as an (N, 3) array, summing over all pairs with NumPy instead of building
+    vectors pair by pair. softening is a Plummer softening length (each pair
+    acts as if it were at least that far apart), and dtype=numpy.float32 trades
+    precision for speed. For example:
+        a = gravityAcceleration([earth.pos, satellite.pos], [earth.m, satellite.m])
+    """
+    pos = numpy.asarray(pos, dtype=dtype).reshape(-1, 3)
+    m = numpy.asarray(m, dtype=dtype).reshape(-1)
+    numBodies = len(pos)
+    acc = numpy.zeros((numBodies, 3), dtype=dtype)
+
+    # Work through the targets in blocks so the pair arrays stay a few MB for large N
+    blockSize = max(1, 2 ** 18 // max(numBodies, 1))
+    for start in range(0, numBodies, blockSize):
+        stop = min(start + blockSize, numBodies)
+
+        # d[i, j] is the vector from target body i to body j
+        d = pos[numpy.newaxis, :, :] - pos[start:stop, numpy.newaxis, :]
+        r2 = numpy.einsum("ijk,ijk->ij", d, d)
+        r2 += dtype(softening) ** 2
+        rows = numpy.arange(stop - start)
+        r2[rows, rows + start] = numpy.inf
+        # m / r**3, divided in two steps so that float32 does not overflow beyond
+        # about 7e12 (r**3 itself would, at solar system distances in meters)
+        acc[start:stop] = G * numpy.einsum("ij,ijk->ik", m / r2 / numpy.sqrt(r2), d)
+    return acc
+
+class PhysGravity:
+    """
+    This class computes the gravitational acceleration of every body due to all
+    the others, either directly (every pair) or with a Barnes-Hut octree, which
+    treats distant groups of bodies as single masses and scales as N log N. The
+    octree only pays off for large N: with theta = 0.5 it overtakes the direct
+    sum at about 5000 bodies (roughly 1 s per evaluation either way), and takes
+    about 6 s for 20000 bodies, so runs that large are for batch work rather
+    than watching. An instance can be passed straight to an integrator as its
+    acceleration function.
+    """
+
+    def __init__(self, m, G=6.673e-11, theta=0.5, method="auto", directMax=5000, softening=0, dtype=numpy.float64):
+        # PhysGravity
+        # m - masses of the bodies, in the same order as the integrator's pos array
+        # G - gravitational constant
+        # softening - Plummer softening length, which keeps close encounters finite
+        # dtype - numpy.float32 halves the memory and time of the direct sum, at lower precision
+        # theta - Barnes-Hut opening angle; a cell of size s at distance d is treated as
+        #         a single mass when s/d < theta (smaller is more accurate, 0 is exact)
+        # method - "direct", "barnes-hut", or "auto" (direct up to directMax bodies)
+        # directMax - largest number of bodies handled directly when method is "auto"
+        #             (the direct sum is the faster of the two up to about 5000)
+
+        try:
+            if method not in ("auto", "direct", "barnes-hut"):
+                raise Exception("ERROR: Unknown gravity method '" + str(method) + "'; choose auto, direct or barnes-hut!")
+            self.m = numpy.array(m, dtype=float).reshape(-1)
+            self.G = G
+            self.theta = theta
+            self.method = method
+            self.directMax = directMax
+            self.softening = softening
+            self.dtype = dtype
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def __call__(self, t, pos, v=None):
+        # Accelerations of all bodies as an (N, 3) array (t and v are ignored)
+        return self.acceleration(pos)
+
+    def acceleration(self, pos):
+        pos = numpy.asarray(pos, dtype=float).reshape(-1, 3)
+        if self.method == "direct" or (self.method == "auto" and len(pos) <= self.directMax):
+            return self.__direct(pos)
+        return self.__barnesHut(pos)
+
+    def __direct(self, pos):
+        return gravityAcceleration(pos, self.m, self.G, self.softening, self.dtype)
+
+    def __barnesHut(self, pos):
+        tree = _Octree(pos, self.m)
+        numBodies = len(pos)
+        acc = numpy.zeros((numBodies, 3))
+
+        # A cell acts as a single mass for bodies further from its center of mass than
+        # its size over theta (plus the center of mass offset, so lopsided cells are
+        # opened sooner); a body inside a cell never qualifies
+        offset = numpy.sqrt(numpy.sum((tree.com - tree.center) ** 2, axis=1))
+        with numpy.errstate(divide="ignore"):
+            openRadius = numpy.maximum(2 * tree.half / self.theta, numpy.sqrt(3) * tree.half) + offset
+        openRadius2 = numpy.where(tree.isLeaf, -1, openRadius ** 2)
+
+        # Walk the tree for all bodies at once, as a list of (body, cell) pairs that
+        # still need looking at; each pass goes one level deeper where needed
+        bodies = numpy.arange(numBodies)
+        cells = numpy.zeros(numBodies, dtype=int)
+        while len(bodies) > 0:
+            d = tree.com[cells] - pos[bodies]
+            r2 = numpy.einsum("ij,ij->i", d, d)
+            accept = r2 > openRadius2[cells]
+
+            # Accepted cells act as one mass at their center of mass, leaving out the
+            # body itself when the cell is the leaf that holds it
+            b = bodies[accept]
+            c = cells[accept]
+            mass = tree.mass[c]
+            com = tree.com[c]
+            own = tree.bodyLeaf[b] == c
+            if own.any():
+                mass = mass.copy()
+                com = com.copy()
+                mass[own] -= self.m[b[own]]
+                rest = own & (mass > 0)
+                com[rest] = (tree.mass[c[rest], numpy.newaxis] * com[rest] - self.m[b[rest], numpy.newaxis] * pos[b[rest]]) / mass[rest, numpy.newaxis]
+                d = com - pos[b]
+                r2 = numpy.einsum("ij,ij->i", d, d)
+                r2[mass <= 0] = numpy.inf
+            else:
+                d = d[accept]
+                r2 = r2[accept]
+            r2 = r2 + self.softening ** 2
+            contribution = (self.G * mass / (r2 * numpy.sqrt(r2)))[:, numpy.newaxis] * d
+            for k in range(3):
+                acc[:, k] += numpy.bincount(b, weights=contribution[:, k], minlength=numBodies)
+
+            # Open the other cells: pair each body with the cell's children
+            children = tree.children[cells[~accept]]
+            hasChild = children >= 0
+            bodies = numpy.repeat(bodies[~accept], 8)[hasChild.reshape(-1)]
+            cells = children[hasChild]
+        return acc
+
+class _Octree:
+    """
+    Octree over a set of bodies, stored as arrays indexed by cell number (cell 0
+    is the root), built one level at a time with NumPy.
+    """
+
+    def __init__(self, pos, m, maxDepth=32):
+        numBodies = len(pos)
+        low = pos.min(axis=0)
+        high = pos.max(axis=0)
+        centers = [(low + high) / 2]
+        halves = [max(numpy.max(high - low) / 2, 1e-300) * (1 + 1e-9)]
+        parents = [numpy.zeros(0, dtype=int)]
+        octants = [numpy.zeros(0, dtype=int)]
+
+        # Bodies that share a cell with another body get pushed down a level
+        bodyCell = numpy.zeros(numBodies, dtype=int)
+        levels = [(numpy.arange(numBodies), bodyCell.copy())]
+        numCells = 1
+        moving = numpy.arange(numBodies)
+        signs = numpy.array([[(o >> k & 1) * 2 - 1 for k in range(3)] for o in range(8)])
+        for depth in range(maxDepth):
+            counts = numpy.bincount(bodyCell[moving], minlength=numCells)
+            moving = moving[counts[bodyCell[moving]] > 1]
+            if len(moving) == 0:
+                break
+            parentCenters = numpy.concatenate([numpy.atleast_2d(c) for c in centers])
+            parentHalves = numpy.concatenate([numpy.atleast_1d(h) for h in halves])
+            octant = numpy.dot(pos[moving] > parentCenters[bodyCell[moving]], [1, 2, 4])
+            keys, inverse = numpy.unique(bodyCell[moving] * 8 + octant, return_inverse=True)
+            parent = keys // 8
+            centers.append(parentCenters[parent] + signs[keys % 8] * (parentHalves[parent] / 2)[:, numpy.newaxis])
+            halves.append(parentHalves[parent] / 2)
+            parents.append(parent)
+            octants.append(keys % 8)
+            bodyCell[moving] = numCells + inverse.reshape(-1)
+            numCells += len(keys)
+            levels.append((moving, bodyCell[moving].copy()))
+
+        self.center = numpy.concatenate([numpy.atleast_2d(c) for c in centers])
+        self.half = numpy.concatenate([numpy.atleast_1d(h) for h in halves])
+        self.children = -numpy.ones((numCells, 8), dtype=int)
+        self.children[numpy.concatenate(parents), numpy.concatenate(octants)] = numpy.arange(1, numCells)
+        self.isLeaf = numpy.all(self.children < 0, axis=1)
+        self.bodyLeaf = bodyCell
+
+        # Each body adds its mass to every cell on its way down
+        self.mass = numpy.zeros(numCells)
+        weighted = numpy.zeros((numCells, 3))
+        for bodies, cellIds in levels:
+            self.mass += numpy.bincount(cellIds, weights=m[bodies], minlength=numCells)
+            for k in range(3):
+                weighted[:, k] += numpy.bincount(cellIds, weights=m[bodies] * pos[bodies, k], minlength=numCells)
+        self.com = weighted / numpy.where(self.mass > 0, self.mass, 1)[:, numpy.newaxis]
+
+class PhysKepler:
+    """
+    This class assists students in checking orbit models against the exact
+    answer: given a body's position and velocity relative to the body it orbits,
+    it gives the position and velocity at any other time directly, for circular,
+    elliptical, parabolic and hyperbolic orbits alike (using the universal
+    variable form of Kepler's equation). Use it to skip the display ahead, or to
+    measure how far an integrated orbit has drifted.
+    """
+
+    def __init__(self, pos, v, M, G=6.673e-11, t=0):
+        # PhysKepler
+        # pos - position relative to the central body at time t
+        # v - velocity relative to the central body at time t
+        # M - mass of the central body (for two bodies of similar mass, use the
+        #     total mass and the position and velocity of one relative to the other)
+        # G - gravitational constant
+        # t - time at which pos and v are given
+
+        try:
+            self.r0 = numpy.array([pos[0], pos[1], pos[2]], dtype=float)
+            self.v0 = numpy.array([v[0], v[1], v[2]], dtype=float)
+            self.mu = G * M
+            self.t0 = t
+
+            # alpha is 1/a: positive for bound orbits, zero for parabolic, negative for hyperbolic
+            self.rMag0 = math.sqrt(numpy.dot(self.r0, self.r0))
+            self.alpha = 2 / self.rMag0 - numpy.dot(self.v0, self.v0) / self.mu
+            self.sigma0 = numpy.dot(self.r0, self.v0) / math.sqrt(self.mu)
+
+            self._t = None
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def period(self):
+        # Time for one orbit (bound orbits only)
+        if self.alpha <= 0:
+            raise Exception("ERROR: The orbit is not closed, so it has no period!")
+        return 2 * math.pi / math.sqrt(self.mu * self.alpha ** 3)
+
+    def state(self, t):
+        # Position and velocity at time t, as arrays; cached per t
+        if t != self._t:
+            dt = t - self.t0
+            if self.alpha > 0:
+                # A bound orbit repeats, so only the time into the current orbit matters
+                dt = math.fmod(dt, self.period())
+
+            u0, u1, u2, u3, r = self.__universal(dt)
+            f = 1 - u2 / self.rMag0
+            g = dt - u3 / math.sqrt(self.mu)
+            fDot = -math.sqrt(self.mu) * u1 / (r * self.rMag0)
+            gDot = 1 - u2 / r
+            self._t = t
+            self._state = (f * self.r0 + g * self.v0, fDot * self.r0 + gDot * self.v0)
+        return self._state
+
+    def position(self, t):
+        return self.state(t)[0]
+
+    def velocity(self, t):
+        return self.state(t)[1]
+
+    def __universal(self, dt):
+        # Solve sqrt(mu) dt = r0 U1 + sigma0 U2 + U3 for the universal anomaly chi
+        # with Laguerre's method, which converges from a rough first guess
+        alpha = self.alpha
+        r0 = self.rMag0
+        sqrtMu = math.sqrt(self.mu)
+        if alpha > 0:
+            chi = sqrtMu * alpha * dt
+        elif alpha < 0 and dt != 0:
+            a = 1 / alpha
+            sign = 1 if dt > 0 else -1
+            guess = -2 * self.mu * alpha * dt / (numpy.dot(self.r0, self.v0) + sign * math.sqrt(-self.mu * a) * (1 - r0 * alpha))
+            chi = sign * math.sqrt(-a) * math.log(guess) if guess > 0 else sqrtMu * dt / r0
+        else:
+            chi = sqrtMu * dt / r0
+
+        n = 5
+        for i in range(100):
+            u0, u1, u2, u3 = _universalFunctions(chi, alpha)
+            F = r0 * u1 + self.sigma0 * u2 + u3 - sqrtMu * dt
+            dF = r0 * u0 + self.sigma0 * u1 + u2
+            ddF = self.sigma0 * u0 + (1 - alpha * r0) * u1
+            root = math.sqrt(abs((n - 1) ** 2 * dF ** 2 - n * (n - 1) * F * ddF))
+            change = n * F / (dF + root if dF >= 0 else dF - root)
+            chi -= change
+            if abs(change) <= 1e-13 * max(1, abs(chi)):
+                break
+        u0, u1, u2, u3 = _universalFunctions(chi, alpha)
+
+        # dF/dchi is the distance from the central body
+        return u0, u1, u2, u3, r0 * u0 + self.sigma0 * u1 + u2
+
+def _universalFunctions(chi, alpha):
+    # Universal functions U0..U3 of the universal anomaly chi, from the Stumpff
+    # functions C(z) and S(z) with z = alpha chi^2 (series near z = 0)
+    z = alpha * chi ** 2
+    if abs(z) < 1e-3:
+        c = 1 / 2 - z / 24 + z ** 2 / 720 - z ** 3 / 40320
+        s = 1 / 6 - z / 120 + z ** 2 / 5040 - z ** 3 / 362880
+    elif z > 0:
+        root = math.sqrt(z)
+        c = (1 - math.cos(root)) / z
+        s = (root - math.sin(root)) / root ** 3
+    else:
+        root = math.sqrt(-z)
+        c = (math.cosh(root) - 1) / -z
+        s = (math.sinh(root) - root) / root ** 3
+    u2 = chi ** 2 * c
+    u3 = chi ** 3 * s
+    return 1 - z * c, chi - alpha * u3, u2, u3
+
+class PhysBinary:
+    """
+    This class assists students in modelling a binary star system without
+    integrating the stars: it gives their positions at any time from the exact
+    two-body (Kepler) solution about their center of mass, and can be passed to
+    an integrator as the acceleration function for a light third body (a
+    satellite or planet) moving through their field.
+    """
+
+    def __init__(self, m1, m2, pos1, pos2, v1, v2, G=6.673e-11, t=0):
+        # PhysBinary
+        # m1, m2 - masses of the two stars
+        # pos1, pos2 - positions of the stars at time t
+        # v1, v2 - velocities of the stars at time t
+        # G - gravitational constant
+        # t - time at which the positions and velocities are given
+
+        try:
+            self.m = numpy.array([m1, m2], dtype=float)
+            self.G = G
+            self.t0 = t
+            pos1 = numpy.array([pos1[0], pos1[1], pos1[2]], dtype=float)
+            pos2 = numpy.array([pos2[0], pos2[1], pos2[2]], dtype=float)
+            v1 = numpy.array([v1[0], v1[1], v1[2]], dtype=float)
+            v2 = numpy.array([v2[0], v2[1], v2[2]], dtype=float)
+
+            # The center of mass drifts uniformly; the stars orbit it in proportion
+            # to each other's mass, so only their separation needs solving
+            self.cmPos = (m1 * pos1 + m2 * pos2) / (m1 + m2)
+            self.cmV = (m1 * v1 + m2 * v2) / (m1 + m2)
+            self.orbit = PhysKepler(pos2 - pos1, v2 - v1, m1 + m2, G, t)
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def period(self):
+        # Time for one orbit of the stars
+        return self.orbit.period()
+
+    def positions(self, t):
+        # Positions of the two stars at time t, as a (2, 3) array
+        r = self.orbit.position(t)
+        cm = self.cmPos + self.cmV * (t - self.t0)
+        total = self.m[0] + self.m[1]
+        return numpy.array([cm - self.m[1] / total * r, cm + self.m[0] / total * r])
+
+    def velocities(self, t):
+        # Velocities of the two stars at time t, as a (2, 3) array
+        v = self.orbit.velocity(t)
+        total = self.m[0] + self.m[1]
+        return numpy.array([self.cmV - self.m[1] / total * v, self.cmV + self.m[0] / total * v])
+
+    def __call__(self, t, pos, v=None):
+        # Acceleration of light bodies at pos (an (N, 3) array) due to the stars at time t
+        pos = numpy.asarray(pos, dtype=float).reshape(-1, 3)
+        d = self.positions(t)[numpy.newaxis, :, :] - pos[:, numpy.newaxis, :]
+        r2 = numpy.sum(d * d, axis=2)
+        return self.G * numpy.einsum("ij,ijk->ik", self.m / (r2 * numpy.sqrt(r2)), d)
+
+def contactTime(pos1, v1, pos2, v2, contactDistance, deltat):
+    """
+    Returns the time within the next deltat at which two spheres moving at
+    constant velocities first come within contactDistance of each other (their
+    centers' separation at touching, normally the sum of the radii), or None if
+    they do not. Unlike checking the separation after each step, this cannot
+    miss a collision when the step is large enough for the spheres to pass
+    through each other.
+    """
+    times = _contactTimes(numpy.array([[pos2[k] - pos1[k] for k in range(3)]], dtype=float),
+                          numpy.array([[v2[k] - v1[k] for k in range(3)]], dtype=float),
+                          contactDistance, deltat)
+    return None if numpy.isnan(times[0]) else float(times[0])
+
+def _contactTimes(d, w, contactDistance, deltat):
+    # Times within [0, deltat] at which pairs with relative positions d and relative
+    # velocities w (both (N, 3) arrays) close to contactDistance, NaN where they do
+    # not; pairs already touching and still approaching touch at 0
+    a = numpy.einsum("ij,ij->i", w, w)
+    b = 2 * numpy.einsum("ij,ij->i", d, w)
+    c = numpy.einsum("ij,ij->i", d, d) - numpy.asarray(contactDistance) ** 2
+    disc = b * b - 4 * a * c
+    times = numpy.empty(len(d))
+    times.fill(numpy.nan)
+    hit = (b < 0) & (disc >= 0)
+
+    # Earlier root of |d + w t| = contactDistance, in the form that avoids cancellation
+    times[hit] = numpy.maximum(2 * c[hit] / (numpy.sqrt(disc[hit]) - b[hit]), 0)
+    times[times > deltat] = numpy.nan
+    return times
+
+def inelasticStep(obj1, obj2, deltat, contactDistance=None):
+    """
+    Moves two objects (with pos, v and m) through a time step deltat at their
+    current velocities, and if they touch during the step, merges their
+    velocities in a perfectly inelastic collision at the moment of contact.
+    Returns the time into the step at which they touched, or None. For example:
+        inelasticStep(ball1, ball2, deltat)
+    """
+    try:
+        if contactDistance is None:
+            contactDistance = obj1.radius + obj2.radius
+        tContact = contactTime(obj1.pos, obj1.v, obj2.pos, obj2.v, contactDistance, deltat)
+        if tContact is None:
+            obj1.pos = obj1.pos + obj1.v * deltat
+            obj2.pos = obj2.pos + obj2.v * deltat
+            return None
+
+        # Move to the moment of contact, stick together, and move together for the rest of the step
+        obj1.pos = obj1.pos + obj1.v * tContact
+        obj2.pos = obj2.pos + obj2.v * tContact
+        vMerged = (obj1.m * obj1.v + obj2.m * obj2.v) / (obj1.m + obj2.m)
+        obj1.v = vector(vMerged)
+        obj2.v = vector(vMerged)
+        obj1.pos = obj1.pos + obj1.v * (deltat - tContact)
+        obj2.pos = obj2.pos + obj2.v * (deltat - tContact)
+        return tContact
+    except TypeError as err:
+        print("**********TYPE ERROR**********")
+        print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+        print("******************************")
+        print(err)
+        raise err
+
+class PhysCollisions:
+    """
+    This class finds and handles collisions among many spheres at once (a gas,
+    a box of marbles, ...), working on the (N, 3) position and velocity arrays
+    of an integrator. Only spheres in neighbouring cells of a grid are tested
+    against each other, so the work grows roughly with the number of spheres
+    rather than the number of pairs.
+    """
+
+    # Half of the 26 neighbouring cells (plus the cell itself), so each pair of cells is visited once
+    neighbourOffsets = [(0, 0, 0)] + [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)
+                                      if (i, j, k) > (0, 0, 0)]
+
+    def __init__(self, radius, m, restitution=1, merge=False):
+        # PhysCollisions
+        # radius - radii of the spheres, an (N,) array or one radius for all
+        # m - masses of the spheres, an (N,) array or one mass for all
+        # restitution - fraction of the approach speed kept in each collision
+        #               (1 is perfectly elastic, 0 leaves the pair moving together)
+        # merge - if True, spheres that touch stick together: each group of touching
+        #         spheres moves with the velocity of its center of mass (as in inelastic.py)
+
+        try:
+            self.radius = numpy.array(radius, dtype=float).reshape(-1)
+            self.m = numpy.array(m, dtype=float).reshape(-1)
+            self.restitution = restitution
+            self.merge = merge
+
+            # Number of pairs the grid passed on to the exact test last time
+            self.numCandidates = 0
         except TypeError as err:
             print("**********TYPE ERROR**********")
             print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
@@ -494,14 +3048,241 @@ class PhysGraph:
             print(err)
             raise err
 
-    def plot(self, independent, *dependents):
+    def _radii(self, n):
+        return self.radius if len(self.radius) == n else numpy.resize(self.radius, n)
+
+    def _masses(self, n):
+        return self.m if len(self.m) == n else numpy.resize(self.m, n)
+
+    def candidates(self, pos, reach=0):
+        # Pairs (i, j) with i < j of spheres in the same or neighbouring grid cells;
+        # the cells are big enough that any pair within reach of touching is included
+        pos = numpy.asarray(pos, dtype=float)
+        radius = self._radii(len(pos))
+        cellSize = 2 * numpy.max(radius) + reach
+        if not cellSize > 0:
+            # Point spheres that are not moving only meet if they coincide, which any
+            # cell size finds; aim for about one sphere per cell
+            cellSize = numpy.max(numpy.ptp(pos, axis=0)) / len(pos) ** (1 / 3) or 1
+        cells = numpy.floor(pos / cellSize).astype(numpy.int64)
+        cells -= cells.min(axis=0) - 1
+        dims = cells.max(axis=0) + 2
+        keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+        order = numpy.argsort(keys, kind="mergesort")
+        sortedKeys = keys[order]
+        first = []
+        second = []
+        for offset in PhysCollisions.neighbourOffsets:
+            neighbourKeys = sortedKeys + (offset[0] * dims[1] + offset[1]) * dims[2] + offset[2]
+            start = numpy.searchsorted(sortedKeys, neighbourKeys, side="left")
+            stop = numpy.searchsorted(sortedKeys, neighbourKeys, side="right")
+            if offset == (0, 0, 0):
+                # Within a cell, pair each sphere only with the ones after it
+                start = numpy.arange(len(pos)) + 1
+            counts = numpy.maximum(stop - start, 0)
+            total = numpy.sum(counts)
+            if total == 0:
+                continue
+            a = numpy.repeat(numpy.arange(len(pos)), counts)
+            b = numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + numpy.repeat(start, counts)
+            first.append(order[a])
+            second.append(order[b])
+        if not first:
+            return numpy.zeros((0, 2), dtype=int)
+        pairs = numpy.column_stack([numpy.concatenate(first), numpy.concatenate(second)])
+        return numpy.sort(pairs, axis=1)
+
+    def pairs(self, pos, v=None, dt=0):
+        # Pairs (i, j) of spheres that are touching (with dt > 0: or will touch within
+        # the next dt at their current velocities), as a (K, 2) array
         try:
-            if len(dependents) != self.numPlots:
-                raise Exception("ERROR: Number of dependent parameters given does not match numPlots given at initialization!")
+            pos = numpy.asarray(pos, dtype=float)
+            v = numpy.zeros_like(pos) if v is None else numpy.asarray(v, dtype=float)
+            reach = 2 * numpy.max(numpy.sqrt(numpy.sum(v * v, axis=1))) * dt if dt > 0 else 0
+            candidates = self.candidates(pos, reach)
+            self.numCandidates = len(candidates)
 
-            # Plot each line based on its parameter!
-            for i in range(len(dependents)):
-                self.graphs[i].plot(pos=(independent,dependents[i]))
+            i, j = candidates[:, 0], candidates[:, 1]
+            radius = self._radii(len(pos))
+            contactDistance = radius[i] + radius[j]
+            d = pos[j] - pos[i]
+            touching = numpy.einsum("ij,ij->i", d, d) < contactDistance ** 2
+            if dt > 0:
+                touching |= ~numpy.isnan(_contactTimes(d, v[j] - v[i], contactDistance, dt))
+            return candidates[touching]
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def collide(self, pos, v, dt=0):
+        # Change the velocities v (in place) of colliding spheres and return the
+        # colliding pairs. With dt = 0, call after each step (then reset the
+        # integrator). With dt > 0, call instead of the position update: the spheres
+        # are moved through the step (pos changes in place, so it must be a float
+        # array) and each pair collides where and when it touches during the step
+        try:
+            pairs = self.pairs(pos, v, dt)
+            if dt > 0:
+                vStart = v.copy()
+            if len(pairs) == 0:
+                if dt > 0:
+                    pos += v * dt
+                return pairs
+            m = self._masses(len(pos))
+            i, j = pairs[:, 0], pairs[:, 1]
+
+            # Positions at the moment of contact (for pairs already touching, now)
+            tContact = numpy.zeros(len(pairs))
+            contactPos = numpy.asarray(pos, dtype=float)
+            if dt > 0:
+                radius = self._radii(len(pos))
+                tContact = _contactTimes(contactPos[j] - contactPos[i], v[j] - v[i], radius[i] + radius[j], dt)
+                tContact[numpy.isnan(tContact)] = 0
+            posI = contactPos[i] + v[i] * tContact[:, numpy.newaxis]
+            posJ = contactPos[j] + v[j] * tContact[:, numpy.newaxis]
+
+            if self.merge:
+                # Give every group of touching spheres its center of mass velocity
+                groups = _connectedGroups(len(pos), pairs)
+                groupMass = numpy.bincount(groups, weights=m)
+                for k in range(3):
+                    groupMomentum = numpy.bincount(groups, weights=m * v[:, k])
+                    inGroup = groupMass[groups] > m
+                    v[inGroup, k] = groupMomentum[groups[inGroup]] / groupMass[groups[inGroup]]
+            else:
+                # Equal and opposite impulses along the line of centers at contact, for
+                # pairs still approaching
+                d = posJ - posI
+                with numpy.errstate(invalid="ignore", divide="ignore"):
+                    n = d / numpy.sqrt(numpy.einsum("ij,ij->i", d, d))[:, numpy.newaxis]
+                approach = numpy.einsum("ij,ij->i", v[j] - v[i], n)
+                closing = approach < 0
+                impulse = (-(1 + self.restitution) * approach / (1 / m[i] + 1 / m[j]))[closing, numpy.newaxis] * n[closing]
+                for k in range(3):
+                    v[:, k] -= numpy.bincount(i[closing], weights=impulse[:, k], minlength=len(v)) / m
+                    v[:, k] += numpy.bincount(j[closing], weights=impulse[:, k], minlength=len(v)) / m
+
+            if dt > 0:
+                # Each sphere moves at its old velocity until its first contact, and at
+                # its new velocity for the rest of the step
+                tFirst = numpy.empty(len(pos))
+                tFirst.fill(dt)
+                numpy.minimum.at(tFirst, i, tContact)
+                numpy.minimum.at(tFirst, j, tContact)
+                pos += vStart * tFirst[:, numpy.newaxis] + v * (dt - tFirst)[:, numpy.newaxis]
+            return pairs
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+def _connectedGroups(n, pairs):
+    # Label each of n items with the smallest index in its group, where pairs link items
+    groups = numpy.arange(n)
+    while True:
+        low = numpy.minimum(groups[pairs[:, 0]], groups[pairs[:, 1]])
+        newGroups = groups.copy()
+        numpy.minimum.at(newGroups, pairs[:, 0], low)
+        numpy.minimum.at(newGroups, pairs[:, 1], low)
+        newGroups = newGroups[newGroups]
+        if numpy.array_equal(newGroups, groups):
+            return groups
+        groups = newGroups
+
+class PhysLoop:
+    """
+    This class assists students in running a model at its full speed while still
+    watching it: it takes several time steps for every frame drawn (at fps frames
+    per second) and updates the attached timers, trails, graphs and motion maps
+    once per frame instead of every step, so a tiny time step no longer slows
+    the model down to the drawing speed.
+    """
+
+    def __init__(self, deltat, stepsPerFrame=None, fps=60, t=0):
+        # PhysLoop
+        # deltat - time step
+        # stepsPerFrame - time steps taken per frame; by default, as many as fit in 1/fps
+        #                 seconds, so the model runs as fast as its physics allows
+        # fps - frames per second to draw
+        # t - starting time
+
+        try:
+            self.deltat = deltat
+            self.stepsPerFrame = stepsPerFrame
+            self.fps = fps
+            self.t0 = t
+            self.t = t
+            self.stepCount = 0
+            self.frameCount = 0
+
+            self.integrators = []
+            self.timers = []
+            self.trails = []
+            self.graphs = []
+            self.motionMaps = []
+        except TypeError as err:
+            print("**********TYPE ERROR**********")
+            print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
+            print("******************************")
+            print(err)
+            raise err
+
+    def addIntegrator(self, integrator):
+        # integrator - PhysIntegrator whose scene objects are moved to its state each frame
+        self.integrators.append(integrator)
+
+    def addTimer(self, timer):
+        # timer - PhysTimer showing the time
+        self.timers.append(timer)
+
+    def addTrail(self, trail, obj):
+        # trail - PhysTrail or curve extended to obj's position each frame
+        self.trails.append((trail, obj))
+
+    def addGraph(self, graph, *quantities):
+        # graph - PhysGraph plotting t against each quantity (functions with no
+        #         arguments, e.g. lambda: ball.pos.y) each frame; a graph the model
+        #         plots itself can be added without quantities to be flushed each frame
+        self.graphs.append((graph, quantities))
+
+    def addMotionMap(self, motionMap, quantity=None):
+        # motionMap - MotionMap or MotionMapN updated each frame, with markers scaled by
+        #             quantity() if given
+        self.motionMaps.append((motionMap, quantity))
+
+    def run(self, step, running=None, tEnd=None):
+        # Run the model until running(t) is False or t reaches tEnd, and return the time
+        # step - function step(t, deltat) making one physics update from time t
+        # running - function running(t) that is True while the model should go on
+        #           (the condition of the model's while loop)
+        # tEnd - time to stop at
+        try:
+            if running is None and tEnd is None:
+                raise Exception("ERROR: PhysLoop.run needs either a running condition or tEnd!")
+            finished = False
+            while not finished:
+                frameStart = time.time()
+                numSteps = 0
+                while self.stepsPerFrame is None or numSteps < self.stepsPerFrame:
+                    if (running is not None and not running(self.t)) or (tEnd is not None and self.t >= tEnd):
+                        finished = True
+                        break
+                    step(self.t, self.deltat)
+                    self.stepCount += 1
+                    self.t = self.t0 + self.stepCount * self.deltat
+                    numSteps += 1
+                    if self.stepsPerFrame is None and time.time() - frameStart >= 1 / self.fps:
+                        break
+                self.drawFrame()
+                if not finished:
+                    rate(self.fps)
+            return self.t
         except TypeError as err:
             print("**********TYPE ERROR**********")
             print("Please check that you are not passing in a variable of the wrong type (e.g. a scalar as a vector, or vice-versa)!")
@@ -509,6 +3290,42 @@ class PhysGraph:
             print(err)
             raise err
 
+    def drawFrame(self):
+        # Bring everything on screen up to the current time
+        for integrator in self.integrators:
+            integrator.sync()
+        for timer in self.timers:
+            timer.update(self.t)
+        for trail, obj in self.trails:
+            trail.append(pos=obj.pos)
+        for graph, quantities in self.graphs:
+            if quantities:
+                graph.plot(self.t, *[quantity() for quantity in quantities])
+            if hasattr(graph, "flush"):
+                graph.flush()
+        for motionMap, quantity in self.motionMaps:
+            if quantity is None:
+                motionMap.update(self.t)
+            else:
+                motionMap.update(self.t, quantity())
+        self.frameCount += 1
+
+def runHeadless(*models):
+    """
+    Runs each of the given model scripts to completion in headless mode.
+    """
+    if not headless:
+        raise Exception("ERROR: runHeadless requires headless mode; run \"python physutil.py --headless model.py\" or set PHYSUTIL_HEADLESS=1 before importing physutil!")
+
+    for model in models:
+        # Models import physutil from their own folder
+        path = os.path.abspath(model)
+        sys.path.insert(0, os.path.dirname(path))
+        try:
+            runpy.run_path(path, run_name="__main__")
+        finally:
+            sys.path.remove(os.path.dirname(path))
+
 """
 #
 #
@@ -567,6 +3384,17 @@ class TestMotionMap(unittest.TestCase):
         self.assertEqual(arrow.color, color.green)
         self.assertEqual(label.text, "2")
 
+    def test_markerScale(self):
+        # Changing markerScale part way through moves the labels of later markers
+        self.map.markerScale = 4
+        self.map.update(3, quantity=2)
+        self.assertEqual(arrow.axis, 8)
+        self.assertEqual(label.pos, self.obj.pos+self.map.labelMarkerOffset-vector(0,2,0))
+
+        self.map.labelMarkerOrder = False
+        self.map.update(5, quantity=2)
+        self.assertEqual(label.pos, self.obj.pos+vector(0,2,0)+self.timeOffset)
+
 class TestMotionMapN(unittest.TestCase):
     def setUp(self):
         self.obj = Mock("obj")
@@ -714,6 +3542,53 @@ class TestPhysGraph(unittest.TestCase):
         self.assertEqual(len(self.physGraph.graphs[-1].plots), 5)
         self.assertEqual(self.physGraph.graphs[-1].plots[0], (vector(0,0,0), vector(1,1,1)))
 
+    def test_decimate(self):
+        physGraph = PhysGraph(numPlots=2, maxPoints=20)
+        for i in range(10000):
+            physGraph.plot(i, math.sin(i / 100), i)
+
+        for i in range(2):
+            self.assertTrue(2 * len(physGraph.buckets[i]) <= 20)
+        self.assertTrue(physGraph.bucketSize[0] >= 10000 / 20)
+
+        # The peaks of the sine wave must survive decimation
+        drawn = [sample[1][1] for bucket in physGraph.buckets[0] for sample in bucket]
+        self.assertAlmostEqual(max(drawn), 1, places=3)
+        self.assertAlmostEqual(min(drawn), -1, places=3)
+        del gcurve.plots[:]
+
+    def test_decimateTail(self):
+        # After flush() the curve reaches the last sample, even part way through a bucket
+        del gcurve.plots[:]
+        physGraph = PhysGraph(maxPoints=20)
+        for i in range(10000):
+            physGraph.plot(i, i % 7)
+        physGraph.flush()
+        self.assertEqual(gcurve.plots[-1][-1], (9999, 9999 % 7))
+        self.assertTrue(len(gcurve.plots[-1]) <= 23)
+
+        # The next finished bucket replaces the drawn tail rather than following it
+        for i in range(10000, 10000 + physGraph.bucketSize[0]):
+            physGraph.plot(i, i % 7)
+        drawn = [point[0] for point in gcurve.plots[-1]]
+        self.assertEqual(drawn, sorted(drawn))
+        self.assertFalse(physGraph.tailDrawn[0])
+        del gcurve.plots[:]
+
+    def test_buffer(self):
+        del gcurve.plots[:]
+        physGraph = PhysGraph(numPlots=2, bufferSize=100)
+        for i in range(250):
+            physGraph.plot(i, i, 2 * i)
+        self.assertEqual(len(gcurve.plots), 4)
+        self.assertEqual(physGraph.numBuffered, 50)
+
+        physGraph.flush()
+        self.assertEqual(len(gcurve.plots), 6)
+        self.assertEqual(physGraph.numSamples, 250)
+        self.assertEqual(gcurve.plots[-1][-1], (249, 498))
+        del gcurve.plots[:]
+
 class TestPhysTimer(unittest.TestCase):
     def setUp(self):
         self.timer = PhysTimer(1,1)
@@ -730,8 +3605,936 @@ class TestPhysTimer(unittest.TestCase):
         self.timer.update(3923.65)
         self.assertEquals(self.timer.timerLabel.text, "3.9237E+03")
 
+    def test_skip(self):
+        # With a tiny time step the text changes only every 1000 steps, so almost
+        # every update should be skipped
+        self.timer.useScientific = True
+        updates = set()
+        for i in range(20000):
+            t = 2e-6 + i * 1e-13
+            self.timer.update(t)
+            updates.add(self.timer.tLow)
+            self.assertEquals(self.timer.timerLabel.text, "%.4E" % t)
+        self.assertTrue(len(updates) <= 50)
+
+        self.timer.useScientific = False
+        updates.clear()
+        for i in range(1000):
+            self.timer.update(i * 0.001)
+            updates.add(self.timer.tLow)
+        self.assertTrue(len(updates) <= 250)
+        self.assertEquals(self.timer.timerLabel.text, "00:00:01.00")
+
+class TestHeadless(unittest.TestCase):
+    def test_vector(self):
+        v = _HeadlessVector(3, 4, 0)
+        self.assertEqual(v.mag, 5)
+        self.assertEqual(v + (1, 1, 1), _HeadlessVector(4, 5, 1))
+        self.assertEqual((1, 1, 1) - v, _HeadlessVector(-2, -3, 1))
+        self.assertEqual(2 * v / 2, v)
+        self.assertEqual(_headlessCross((1, 0, 0), (0, 1, 0)), _HeadlessVector(0, 0, 1))
+
+        v.mag = 10
+        self.assertEqual(v, _HeadlessVector(6, 8, 0))
+
+    def test_primitives(self):
+        box = _headlessPrimitiveType("box")
+        cart = box(pos=(1, 0, 0), size=(2, 1, 1))
+        self.assertEqual(cart.pos, _HeadlessVector(1, 0, 0))
+        self.assertEqual(cart.length, 2)
+
+        cart.rotate(angle=math.pi / 2, origin=(0, 0, 0), axis=(0, 0, 1))
+        self.assertAlmostEqual(cart.pos.y, 1)
+        self.assertAlmostEqual(cart.axis.y, 2)
+
+        trail = _HeadlessCurve()
+        trail.append(pos=cart.pos)
+        self.assertEqual(len(trail.pos), 1)
+
+        scene = _HeadlessDisplay()
+        scene.title = "Headless"
+        self.assertEqual(scene.mouse.clicked, 0)
+        self.assertEqual(_headlessRate(1000), None)
+
+    def test_mouse(self):
+        # A model waiting for a click must still end
+        mouse = _HeadlessDisplay().mouse
+        self.assertEqual(mouse.getclick().pos, _HeadlessVector(0, 0, 0))
+        polls = 1
+        while not mouse.clicked:
+            polls += 1
+        self.assertEqual(polls, mouse.clickAfter)
+        self.assertEqual(mouse.clicked, 0)
+
+
+class TestPhysIntegrator(unittest.TestCase):
+    def setUp(self):
+        self.obj = Mock("obj")
+        self.obj.pos = vector(-150, 0, 0)
+        self.obj.v = vector(30, 40, 0)
+        self.obj.m = 0.6
+        self.g = (0, -9.8, 0)
+
+    def test_init(self):
+        integrator = PhysIntegrator(self.obj, lambda t, pos, v: self.g)
+        self.assertEqual(integrator.objs, [self.obj])
+        self.assertEqual(integrator.pos.shape, (1, 3))
+        self.assertEqual(integrator.v[0, 1], 40)
+        self.assertEqual(integrator.m[0], 0.6)
+        self.assertEqual(integrator.method, "euler-cromer")
+        self.assertRaises(Exception, PhysIntegrator, self.obj, None, method="magic")
+
+    def test_advance(self):
+        # Euler-Cromer must match the hand-written loop in the models
+        pos = vector(-150, 0, 0)
+        v = vector(30, 40, 0)
+        for i in range(100):
+            v = v + vector(0, -9.8, 0) * 0.01
+            pos = pos + v * 0.01
+
+        integrator = PhysIntegrator(self.obj, lambda t, pos, v: self.g)
+        integrator.advance(0.01, 100)
+        self.assertEqual(integrator.stepCount, 100)
+        self.assertAlmostEqual(integrator.t, 1)
+        self.assertAlmostEqual(self.obj.pos.x, pos.x)
+        self.assertAlmostEqual(self.obj.pos.y, pos.y)
+        self.assertAlmostEqual(self.obj.v.y, v.y)
+
+    def test_euler(self):
+        integrator = PhysIntegrator(None, lambda t, pos, v: self.g, method="euler",
+                    pos=[[0, 0, 0], [1, 0, 0]], v=[[0, 0, 0], [0, 1, 0]])
+        integrator.step(1)
+        self.assertEqual(integrator.pos[0, 1], 0)
+        self.assertEqual(integrator.pos[1, 1], 1)
+        self.assertAlmostEqual(integrator.v[0, 1], -9.8)
+
+class TestPhysEnsemble(unittest.TestCase):
+    def setUp(self):
+        # Launch one ball per angle from the same spot, as in the PMPM lab
+        self.angles = numpy.radians([20, 40, 60])
+        self.v = numpy.column_stack((4.1 * numpy.cos(self.angles), 4.1 * numpy.sin(self.angles),
+                    numpy.zeros(3)))
+        self.ensemble = PhysEnsemble((0, 1.17, 0), self.v, lambda t, pos, v: (0, -9.8, 0),
+                    running=lambda t, pos, v: pos[:, 1] >= 0)
+
+    def test_init(self):
+        self.assertEqual(self.ensemble.numMembers, 3)
+        self.assertEqual(self.ensemble.pos.shape, (3, 3))
+        self.assertEqual(self.ensemble.pos[2, 1], 1.17)
+        self.assertTrue(self.ensemble.active.all())
+
+    def test_run(self):
+        self.ensemble.run(0.001)
+        self.assertFalse(self.ensemble.active.any())
+
+        # Each member must match a single run with the same launch angle
+        for i in range(3):
+            single = PhysIntegrator(None, lambda t, pos, v: (0, -9.8, 0),
+                        pos=[0, 1.17, 0], v=self.v[i])
+            while single.pos[0, 1] >= 0:
+                single.step(0.001)
+            self.assertAlmostEqual(self.ensemble.tFinal[i], single.t)
+            self.assertAlmostEqual(self.ensemble.pos[i, 0], single.pos[0, 0])
+
+        self.assertTrue(self.ensemble.tFinal[0] < self.ensemble.tFinal[2])
+
+    def test_tMax(self):
+        ensemble = PhysEnsemble((0, 0, 0), self.v, lambda t, pos, v: (0, 0, 0))
+        self.assertRaises(Exception, ensemble.run, 0.1)
+        ensemble.run(0.25, tMax=1)
+        self.assertAlmostEqual(ensemble.tFinal[0], 1)
+        self.assertAlmostEqual(ensemble.pos[1, 0], self.v[1, 0])
+
+class TestPhysLaunchSolver(unittest.TestCase):
+    def setUp(self):
+        # Same setup as the PMPM lab
+        self.solver = PhysLaunchSolver(4.1, startPos=(0, 1.17, 0))
+
+    def test_range(self):
+        self.assertAlmostEqual(self.solver.range(0), 4.1 * math.sqrt(2 * 1.17 / 9.8), places=2)
+        self.solver.range(0)
+        self.assertEqual(self.solver.numIntegrations, 1)
+
+    def test_solve(self):
+        theta = self.solver.solve(1.75)
+        self.assertTrue(abs(self.solver.range(theta) - 1.75) <= 0.04)
+        self.assertTrue(theta > 45)
+        self.assertTrue(self.solver.numIntegrations <= 15)
+
+        self.assertRaises(Exception, self.solver.solve, 10)
+
+    def test_nearMaximum(self):
+        # Just short of the maximum range (about 10.20 m at 45 degrees) the 10 degree
+        # samples all fall short, but the angle is still found
+        solver = PhysLaunchSolver(10, deltat=0.0005)
+        maxRange = solver.range(45)
+        theta = solver.solve(maxRange - 0.01, tolerance=0.005)
+        self.assertTrue(abs(solver.range(theta) - (maxRange - 0.01)) <= 0.005)
+        self.assertTrue(30 < theta < 45)
+        self.assertRaises(Exception, solver.solve, maxRange + 0.05, tolerance=0.005)
+
+    def test_reuse(self):
+        # Each solve gets its own budget, however many flights earlier solves took
+        for targetRange in [1.5, 1.6, 1.75, 1.9, 2.0]:
+            theta = self.solver.solve(targetRange, maxIntegrations=10)
+            self.assertTrue(abs(self.solver.range(theta) - targetRange) <= 0.04)
+        self.assertTrue(self.solver.numIntegrations > 10)
+
+class TestPhysAdaptiveIntegrator(unittest.TestCase):
+    def setUp(self):
+        # Satellite around the earth, as in satellite.py
+        self.GM = 6.673e-11 * 5.972e24
+        self.r = 4.23e7
+        self.vCircular = math.sqrt(self.GM / self.r)
+        self.gravity = lambda t, pos, v: -self.GM * pos / numpy.sum(pos ** 2, axis=1)[:, numpy.newaxis] ** 1.5
+
+    def test_circular(self):
+        satellite = Mock("satellite")
+        satellite.pos = vector(self.r, 0, 0)
+        satellite.v = vector(0, self.vCircular, 0)
+        integrator = PhysAdaptiveIntegrator(satellite, self.gravity, rtol=1e-9)
+        period = 2 * math.pi * math.sqrt(self.r ** 3 / self.GM)
+        integrator.advanceTo(period)
+
+        self.assertEqual(integrator.t, period)
+        self.assertTrue((satellite.pos - vector(self.r, 0, 0)).mag < 1e-5 * self.r)
+        self.assertTrue(integrator.stepCount < 1000)
+
+    def test_eccentric(self):
+        integrator = PhysAdaptiveIntegrator(None, self.gravity, rtol=1e-8,
+                    pos=[self.r, 0, 0], v=[0, 0.3 * self.vCircular, 0])
+        steps = []
+        while integrator.t < 1e5:
+            steps.append(integrator.adaptiveStep())
+
+        # Tiny steps through the close approach, big ones far away
+        self.assertTrue(min(steps) < max(steps) / 20)
+        self.assertAlmostEqual(integrator.dtMin, 0)
+
+    def test_step(self):
+        # step(dt) advances by dt, as PhysIntegrator's does, however many steps that takes
+        integrator = PhysAdaptiveIntegrator(None, self.gravity, pos=[self.r, 0, 0], v=[0, self.vCircular, 0])
+        integrator.step(3600)
+        integrator.step(3600)
+        self.assertAlmostEqual(integrator.t, 7200)
+        self.assertTrue(integrator.stepCount > 2)
+
+class TestSymplectic(unittest.TestCase):
+    def setUp(self):
+        # Mass on a spring as in shm.py, but with a 50 times larger time step
+        self.k = 2.0
+        self.m = 0.5
+        self.spring = lambda t, pos, v: -self.k / self.m * pos
+
+    def energy(self, integrator):
+        return 0.5 * self.m * numpy.sum(integrator.v ** 2) + 0.5 * self.k * numpy.sum(integrator.pos ** 2)
+
+    def test_energy(self):
+        errors = {}
+        for method in ["euler-cromer", "verlet", "yoshida4"]:
+            integrator = PhysIntegrator(None, self.spring, method=method, pos=[0, 0, 0], v=[1, 0, 0])
+            worst = 0
+            for i in range(2000):
+                integrator.step(0.05)
+                worst = max(worst, abs(self.energy(integrator) - 0.25))
+            errors[method] = worst / 0.25
+
+        self.assertTrue(errors["verlet"] < 0.01)
+        self.assertTrue(errors["yoshida4"] < errors["verlet"] / 100)
+        self.assertTrue(errors["euler-cromer"] > errors["verlet"])
+
+    def test_ensemble(self):
+        # Symplectic methods also work for ensembles, with stopped members frozen
+        ensemble = PhysEnsemble((0, 0, 0), [[1, 0, 0], [2, 0, 0]], self.spring, method="yoshida4",
+                    running=lambda t, pos, v: pos[:, 0] < 0.3)
+        ensemble.run(0.01)
+        self.assertTrue(ensemble.tFinal[1] < ensemble.tFinal[0])
+        self.assertEqual(ensemble.pos[1, 0], ensemble.posFinal[1, 0])
+
+class TestPhysTrail(unittest.TestCase):
+    def setUp(self):
+        curve.reset()
+        curve.appended = []
+        def mockAppend(pos, retain=None):
+            curve.appended.append(pos)
+            del curve.appended[:-retain]
+        curve.append = mockAppend
+
+        self.trail = PhysTrail(maxLength=5, color=color.green)
+
+    def test_init(self):
+        self.assertEqual(curve.called, 1)
+        self.assertEqual(curve.color, color.green)
+        self.assertEqual(self.trail.numPoints, 0)
+
+    def test_append(self):
+        for i in range(8):
+            self.trail.append(vector(i, 0, 0))
+        self.assertEqual(self.trail.numPoints, 5)
+        self.assertEqual(self.trail.positions()[:, 0].tolist(), [3, 4, 5, 6, 7])
+        self.assertEqual(len(curve.appended), 5)
+
+        self.trail.clear()
+        self.assertEqual(len(self.trail.positions()), 0)
+
+    def test_epsilon(self):
+        trail = PhysTrail(maxLength=100, epsilon=1)
+        for i in range(10):
+            trail.append(vector(0.5 * i, 0, 0))
+        self.assertEqual(trail.positions()[:, 0].tolist(), [0, 1, 2, 3, 4])
+
+class TestPhysRecorder(unittest.TestCase):
+    def setUp(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), "run.npy")
+        self.recorder = PhysRecorder(self.filename, ["t", ("pos", 3), "KE"], chunkSize=10)
+
+    def tearDown(self):
+        self.recorder.close()
+        os.remove(self.filename)
+
+    def test_init(self):
+        self.assertEqual(self.recorder.fields, [("t", 1), ("pos", 3), ("KE", 1)])
+        self.assertEqual(self.recorder.chunk.shape, (10,))
+        self.assertRaises(Exception, self.recorder.record, 0)
+
+    def test_record(self):
+        for i in range(25):
+            self.recorder.record(i * 0.1, vector(i, 2 * i, 0), 0.5 * i ** 2)
+        self.assertEqual(self.recorder.numRecords, 20)
+        self.recorder.close()
+
+        data = numpy.load(self.filename, mmap_mode="r")
+        self.assertEqual(data.shape, (25,))
+        self.assertAlmostEqual(data["t"][24], 2.4)
+        self.assertEqual(data["pos"][24].tolist(), [24, 48, 0])
+        self.assertEqual(data["KE"][2], 2)
+        del data
+
+    def test_unclosed(self):
+        # A run that stops without close() still leaves every chunk written readable
+        for i in range(14):
+            self.recorder.record(i * 0.1, vector(i, 2 * i, 0), 0.5 * i ** 2)
+        data = numpy.load(self.filename)
+        self.assertEqual(data.shape, (10,))
+        self.assertEqual(data["pos"][9].tolist(), [9, 18, 0])
+        self.recorder.flush()
+        data = numpy.load(self.filename, mmap_mode="r")
+        self.assertEqual(data.shape, (14,))
+        self.assertAlmostEqual(data["t"][13], 1.3)
+        del data
+
+class TestPhysReplay(unittest.TestCase):
+    def setUp(self):
+        # A recorded ball moving along x at 1 m/s, 100 steps per second
+        self.data = numpy.zeros(500, dtype=[("t", "<f8"), ("pos", "<f8", (3,)), ("v", "<f8", (3,))])
+        self.data["t"] = numpy.arange(500) * 0.01
+        self.data["pos"][:, 0] = self.data["t"]
+        self.data["v"][:, 0] = 1
+
+        curve.append = lambda pos, retain=None: None
+        self.obj = Mock("obj")
+        self.obj.pos = vector(0, 0, 0)
+        self.timer = PhysTimer(1, 1)
+        self.trail = PhysTrail(maxLength=50)
+        self.motionMap = MotionMap(self.obj, 5, 5, labelMarkerOrder=False)
+        self.replay = PhysReplay(self.data, self.obj)
+        self.replay.addTimer(self.timer)
+        self.replay.addTrail(self.trail)
+        self.replay.addMotionMap(self.motionMap, "v")
+
+    def test_seek(self):
+        self.replay.seek(3.005)
+        self.assertEqual(self.replay.index, 300)
+        self.assertAlmostEqual(self.obj.pos.x, 3)
+        self.assertEqual(self.timer.timerLabel.text, "00:00:03.00")
+        self.assertEqual(self.trail.numPoints, 50)
+        self.assertAlmostEqual(self.trail.positions()[-1, 0], 3)
+        self.assertEqual(self.motionMap.curMarker, 3)
+
+        # Scrubbing backward rebuilds the trail
+        self.replay.step(-290)
+        self.assertEqual(self.replay.index, 10)
+        self.assertEqual(self.trail.numPoints, 11)
+
+    def test_seekBack(self):
+        # Going back and forward again must not send the graph anything twice
+        del gcurve.plots[:]
+        self.replay.addGraph(PhysGraph(), "t", "t")
+        self.replay.seek(3.0)
+        self.replay.seek(1.0)
+        self.replay.seek(3.0)
+        self.assertEqual(self.replay.index, 300)
+        self.assertEqual(self.replay.fedIndex, 300)
+        self.assertEqual(len(gcurve.plots), 301)
+        times = [plot[0] for plot in gcurve.plots]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(self.motionMap.curMarker, 3)
+
+        self.replay.seek(4.0)
+        self.assertEqual(len(gcurve.plots), 401)
+        del gcurve.plots[:]
+
+    def test_markerPositions(self):
+        # One jump over many records still drops each marker where the object was then
+        positions = []
+        def recordArrow(**kwargs):
+            positions.append(kwargs["pos"].x)
+            return Mock("arrow")
+        mockArrow = arrow
+        globals()["arrow"] = recordArrow
+        try:
+            self.replay.seek(4.5)
+        finally:
+            globals()["arrow"] = mockArrow
+        self.assertEqual(self.motionMap.curMarker, 5)
+        self.assertEqual([round(x, 6) for x in positions], [0.01, 1.01, 2.01, 3.01, 4.01])
+
+    def test_play(self):
+        self.replay.play(speed=100)
+        self.assertEqual(self.replay.index, 499)
+        self.assertAlmostEqual(self.obj.pos.x, 4.99)
+        self.assertEqual(self.motionMap.curMarker, 5)
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), "checkpoint.pkl")
+        curve.append = lambda pos, retain=None: None
+        self.spring = lambda t, pos, v: -4 * pos - 0.1 * v
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_integrator(self):
+        integrator = PhysIntegrator(None, self.spring, method="verlet", pos=[1, 0, 0], v=[0, 1, 0])
+        for i in range(100):
+            integrator.step(0.01)
+        saveCheckpoint(self.filename, t=integrator.t, integrator=integrator)
+        for i in range(100):
+            integrator.step(0.01)
+
+        # The restored run must continue exactly as the original did
+        restored = PhysIntegrator(None, self.spring, method="verlet", pos=[0, 0, 0], v=[0, 0, 0])
+        state = loadCheckpoint(self.filename, integrator=restored)
+        for i in range(100):
+            restored.step(0.01)
+        self.assertAlmostEqual(state["t"], 1)
+        self.assertEqual(restored.t, integrator.t)
+        self.assertEqual(restored.pos.tolist(), integrator.pos.tolist())
+        self.assertEqual(restored.v.tolist(), integrator.v.tolist())
+        self.assertEqual(restored.stepCount, 200)
+
+        self.assertRaises(Exception, loadCheckpoint, self.filename, trail=PhysTrail())
+
+    def test_display(self):
+        obj = Mock("obj")
+        obj.pos = vector(0, 0, 0)
+        motionMap = MotionMap(obj, 10, 5)
+        motionMap.curMarker = 3
+        trail = PhysTrail(maxLength=10)
+        for i in range(15):
+            trail.append(vector(i, 0, 0))
+        graph = PhysGraph(2, maxPoints=10, bufferSize=7)
+        for i in range(100):
+            graph.plot(i, i, -i)
+        timer = PhysTimer(1, 1)
+        timer.update(61)
+        saveCheckpoint(self.filename, motionMap=motionMap, trail=trail, graph=graph, timer=timer)
+
+        motionMap2 = MotionMap(obj, 10, 5)
+        trail2 = PhysTrail(maxLength=10)
+        graph2 = PhysGraph(2, maxPoints=10, bufferSize=7)
+        timer2 = PhysTimer(1, 1)
+        loadCheckpoint(self.filename, motionMap=motionMap2, trail=trail2, graph=graph2, timer=timer2)
+        self.assertEqual(motionMap2.curMarker, 3)
+        self.assertEqual(trail2.positions().tolist(), trail.positions().tolist())
+        self.assertEqual(graph2.buckets, graph.buckets)
+        self.assertEqual(graph2.bucketSize, graph.bucketSize)
+        self.assertEqual(graph2.numBuffered, graph.numBuffered)
+        self.assertEqual(timer2.timerLabel.text, "00:01:01.00")
+        del gcurve.plots[:]
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.model = os.path.join(self.folder, "model.py")
+        modelFile = open(self.model, "w")
+        modelFile.write("from __future__ import division, print_function\n"
+                        "from visual import *\n"
+                        "from physutil import *\n"
+                        "ball = sphere()\n"
+                        "ball.pos = vector(0, 0, 0)\n"
+                        "speed = 1.0\n"
+                        "g = 9.8\n"
+                        "rate(1000)\n"
+                        "ball.pos.x = speed * 2\n"
+                        "print('final position (m): ', ball.pos)\n"
+                        "print(speed * g)\n")
+        modelFile.close()
+
+    def tearDown(self):
+        os.remove(self.model)
+
+    def test_override(self):
+        source = _overrideParameters("x = 1\nif x == 1:\n    x = 3\ncart.v.mag = 3\n", {"x": 2, "cart.v.mag": "4 * 2"})
+        self.assertEqual(source, "x = 2\nif x == 1:\n    x = 3\ncart.v.mag = 4 * 2\n")
+        self.assertRaises(Exception, _overrideParameters, "y = 1\n", {"x": 2})
+
+    def test_sweep(self):
+        csvFile = os.path.join(self.folder, "results.csv")
+        results = sweep(self.model, {"speed": [1, 2, 3], "g": [10, 20]}, processes=2, csvFile=csvFile)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[0]["g"], 10)
+        self.assertEqual(results[0]["final position (m)"], (2, 0, 0))
+        self.assertEqual(results[5]["output1"], 60)
+        self.assertTrue("error" not in results[0])
+
+        csvLines = open(csvFile).read().splitlines()
+        self.assertEqual(csvLines[0].split(",")[:2], ["g", "speed"])
+        self.assertEqual(len(csvLines), 7)
+        os.remove(csvFile)
+
+class TestPhysGravity(unittest.TestCase):
+    def setUp(self):
+        random = numpy.random.RandomState(1)
+        self.pos = random.normal(size=(300, 3))
+        self.m = random.uniform(1, 2, size=300)
+
+    def test_twoBody(self):
+        gravity = PhysGravity([5.972e24, 1000])
+        acc = gravity(0, [[0, 0, 0], [4.23e7, 0, 0]])
+        self.assertAlmostEqual(acc[1, 0], -6.673e-11 * 5.972e24 / 4.23e7 ** 2)
+        self.assertAlmostEqual(acc[0, 0] / acc[1, 0], -1000 / 5.972e24)
+        self.assertRaises(Exception, PhysGravity, [1], method="magic")
+
+    def test_barnesHut(self):
+        direct = PhysGravity(self.m, G=1, method="direct")(0, self.pos)
+
+        # An opening angle of 0 opens every cell, so it must match the direct sum
+        exact = PhysGravity(self.m, G=1, theta=0, method="barnes-hut")(0, self.pos)
+        self.assertTrue(numpy.allclose(exact, direct, rtol=1e-9, atol=0))
+
+        approx = PhysGravity(self.m, G=1, theta=0.5, method="barnes-hut")(0, self.pos)
+        error = numpy.sqrt(numpy.sum((approx - direct) ** 2, axis=1) / numpy.sum(direct ** 2, axis=1))
+        self.assertTrue(numpy.median(error) < 0.01)
+
+    def test_integrator(self):
+        # Usable directly as an integrator's acceleration function
+        integrator = PhysIntegrator(None, PhysGravity([1e10, 1e10], method="barnes-hut"), method="verlet",
+                    pos=[[-1, 0, 0], [1, 0, 0]], v=[[0, 0, 0], [0, 0, 0]])
+        integrator.step(1)
+        self.assertTrue(integrator.v[0, 0] > 0)
+        self.assertAlmostEqual(integrator.v[0, 0], -integrator.v[1, 0])
+
+class TestGravityAcceleration(unittest.TestCase):
+    def test_pairs(self):
+        pos = [[0, 0, 0], [4.23e7, 0, 0], [0, 3e7, 0]]
+        m = [5.972e24, 1000, 0]
+        acc = gravityAcceleration(pos, m)
+        self.assertEqual(acc.shape, (3, 3))
+        self.assertAlmostEqual(acc[1, 0], -6.673e-11 * 5.972e24 / 4.23e7 ** 2)
+        self.assertAlmostEqual(acc[2, 1], -6.673e-11 * 5.972e24 / 9e14, 5)
+
+        # Massless bodies feel gravity but do not pull on anything
+        self.assertAlmostEqual(acc[0, 0], 6.673e-11 * 1000 / 4.23e7 ** 2)
+
+    def test_softening(self):
+        acc = gravityAcceleration([[0, 0, 0], [3, 0, 0]], [1, 1], G=1, softening=4)
+        self.assertAlmostEqual(acc[0, 0], 3 / 125)
+        self.assertTrue(numpy.isfinite(gravityAcceleration([[0, 0, 0], [0, 0, 0]], [1, 1], softening=1)).all())
+
+    def test_blocksAndSingle(self):
+        random = numpy.random.RandomState(2)
+        pos = random.normal(size=(600, 3))
+        m = random.uniform(1, 2, size=600)
+        acc = gravityAcceleration(pos, m, G=1)
+        d = pos[:5, numpy.newaxis, :] - pos[numpy.newaxis, :, :]
+        r = numpy.sqrt(numpy.sum(d * d, axis=2))
+        r[numpy.arange(5), numpy.arange(5)] = numpy.inf
+        self.assertTrue(numpy.allclose(acc[:5], -numpy.sum((m / r ** 3)[:, :, numpy.newaxis] * d, axis=1)))
+
+        single = gravityAcceleration(pos, m, G=1, dtype=numpy.float32)
+        self.assertEqual(single.dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(single, acc, rtol=1e-3, atol=1e-3))
+
+    def test_solarSystem(self):
+        # Sun, earth (1 AU) and a body at 100 AU, in SI units
+        pos = [[0, 0, 0], [1.496e11, 0, 0], [0, 1.496e13, 0]]
+        m = [1.989e30, 5.972e24, 1e20]
+        acc = gravityAcceleration(pos, m)
+        single = gravityAcceleration(pos, m, dtype=numpy.float32)
+        self.assertTrue(numpy.isfinite(single).all())
+        self.assertTrue(numpy.allclose(single, acc, rtol=1e-4, atol=0))
+        self.assertAlmostEqual(single[1, 0] / (-6.673e-11 * 1.989e30 / 1.496e11 ** 2), 1, 4)
+        self.assertTrue(single[2, 1] < 0)
+
+class TestPhysBinary(unittest.TestCase):
+    def setUp(self):
+        # Equal stars on a circular orbit, and an eccentric pair
+        speed = math.sqrt(6.673e-11 * 2 * 5.972e24 / 8.46e7) / 2
+        self.circular = PhysBinary(5.972e24, 5.972e24, [0, 0, 0], [8.46e7, 0, 0], [0, -speed, 0], [0, speed, 0])
+        self.eccentric = PhysBinary(2e30, 1e30, [0, 0, 0], [1e11, 0, 0], [0, -1e4, 0], [0, 2e4, 0], t=5)
+
+    def test_circular(self):
+        period = self.circular.period()
+        quarter = self.circular.positions(period / 4)
+        self.assertAlmostEqual(quarter[0, 0] / 4.23e7, 1)
+        self.assertAlmostEqual(quarter[0, 1] / 4.23e7, -1)
+        self.assertAlmostEqual(quarter[1, 1] / 4.23e7, 1)
+        self.assertTrue(numpy.allclose(self.circular.positions(10 * period), [[0, 0, 0], [8.46e7, 0, 0]], atol=1))
+
+    def test_eccentric(self):
+        # Matches a small-step integration of the two stars
+        stars = PhysIntegrator(None, PhysGravity([2e30, 1e30]), method="yoshida4", t=5,
+                    pos=[[0, 0, 0], [1e11, 0, 0]], v=[[0, -1e4, 0], [0, 2e4, 0]])
+        stars.advance(3600, 1000)
+        self.assertTrue(numpy.allclose(self.eccentric.positions(stars.t), stars.pos, atol=1e3))
+        self.assertTrue(numpy.allclose(self.eccentric.velocities(stars.t), stars.v, atol=1e-3))
+
+    def test_acceleration(self):
+        # Midway between equal stars the pulls cancel
+        acc = self.circular(0, [[4.23e7, 0, 0], [4.23e7, 1e7, 0]])
+        self.assertAlmostEqual(acc[0, 0], 0)
+        self.assertTrue(acc[1, 1] < 0)
+
+class TestPhysKepler(unittest.TestCase):
+    def test_satellite(self):
+        # The orbit from satellite.py, against a small-step integration
+        orbit = PhysKepler([4.23e7, 0, 0], [0, 3.07e3, 0], 5.972e24)
+        satellite = PhysIntegrator(None, PhysGravity([5.972e24, 0]), method="yoshida4",
+                    pos=[[0, 0, 0], [4.23e7, 0, 0]], v=[[0, 0, 0], [0, 3.07e3, 0]])
+        satellite.advance(100, 3000)
+        self.assertTrue(numpy.allclose(orbit.position(satellite.t), satellite.pos[1], atol=10))
+        self.assertTrue(numpy.allclose(orbit.velocity(satellite.t), satellite.v[1], atol=1e-3))
+
+        # Whole orbits later (and earlier) it is back where it started
+        period = orbit.period()
+        self.assertTrue(numpy.allclose(orbit.position(1000 * period), [4.23e7, 0, 0], atol=1))
+        self.assertTrue(numpy.allclose(orbit.position(-3 * period), [4.23e7, 0, 0], atol=1e-3))
+
+    def test_openOrbits(self):
+        mu = 6.673e-11 * 5.972e24
+        for speed in (math.sqrt(2 * mu / 7e6), 1.5e4):
+            orbit = PhysKepler([7e6, 0, 0], [0, speed, 0], 5.972e24, t=100)
+            self.assertRaises(Exception, orbit.period)
+            for t in (-5e4, 100, 3e3, 1e6):
+                pos, v = orbit.state(t)
+                r = math.sqrt(numpy.dot(pos, pos))
+
+                # Energy and angular momentum are those of the starting point
+                energy = numpy.dot(v, v) / 2 - mu / r
+                self.assertAlmostEqual((energy - (speed ** 2 / 2 - mu / 7e6)) / (mu / 7e6), 0, 6)
+                self.assertAlmostEqual(numpy.cross(pos, v)[2] / (7e6 * speed), 1, 6)
+
+            # Starting from a later point and going back gives the first point
+            back = PhysKepler(pos, v, 5.972e24, t=1e6)
+            self.assertTrue(numpy.allclose(back.position(100), [7e6, 0, 0], atol=1e-2))
+
+class TestEvents(unittest.TestCase):
+    def setUp(self):
+        self.g = lambda t, pos, v: numpy.array([[0, -9.8, 0]])
+
+    def test_landing(self):
+        # A 30 m/s launch at 45 degrees lands at exactly 2 vy / g with steps of 0.1 s
+        vy = 30 * math.sin(math.radians(45))
+        for method in ("euler-cromer", "verlet", "yoshida4"):
+            integrator = PhysIntegrator(None, self.g, method=method, pos=[[0, 0, 0]], v=[[vy, vy, 0]])
+            integrator.addEvent(lambda t, pos, v: pos[0, 1], direction=-1)
+            integrator.advance(0.1, 100)
+            self.assertTrue(integrator.stopped)
+            self.assertEqual(len(integrator.eventLog), 1)
+            self.assertAlmostEqual(integrator.pos[0, 1], 0, 6)
+            if method != "euler-cromer":
+                self.assertAlmostEqual(integrator.t, 2 * vy / 9.8, 10)
+                self.assertAlmostEqual(integrator.pos[0, 0], 30 ** 2 / 9.8, 8)
+
+            # Once stopped, further steps do nothing
+            tStop = integrator.t
+            integrator.step(0.1)
+            self.assertEqual(integrator.t, tStop)
+
+    def test_nonTerminal(self):
+        # A mass on a spring passes through equilibrium twice per period, in alternate directions
+        spring = lambda t, pos, v: -pos
+        integrator = PhysAdaptiveIntegrator(None, spring, rtol=1e-10, atol=1e-10, pos=[[1, 0, 0]], v=[[0, 0, 0]])
+        downward = integrator.addEvent(lambda t, pos, v: pos[0, 0], direction=-1, terminal=False)
+        crossing = integrator.addEvent(lambda t, pos, v: pos[0, 0], terminal=False)
+        integrator.advanceTo(4 * math.pi)
+        self.assertFalse(integrator.stopped)
+        self.assertEqual([i for t, i in integrator.eventLog], [downward, crossing, crossing, downward, crossing, crossing])
+        times = sorted(set(t for t, i in integrator.eventLog))
+        for k in range(4):
+            self.assertAlmostEqual(times[k], math.pi / 2 + k * math.pi, 8)
+
+    def test_interpolate(self):
+        # Between step ends the motion follows the dense output, not a straight line
+        integrator = PhysIntegrator(None, self.g, method="verlet", pos=[[0, 0, 0]], v=[[1, 10, 0]])
+        integrator.step(1)
+        pos, v = integrator.interpolate(0.25)
+        self.assertAlmostEqual(pos[0, 1], 10 * 0.25 - 4.9 * 0.25 ** 2)
+        self.assertAlmostEqual(v[0, 1], 10 - 9.8 * 0.25)
+
+class TestContact(unittest.TestCase):
+    def test_contactTime(self):
+        # A step of 10 s would carry the balls straight through each other
+        self.assertAlmostEqual(contactTime([-1, 0, 0], [1, 0, 0], [1, 0, 0], [-1, 0, 0], 0.2, 10), 0.9)
+        self.assertEqual(contactTime([-1, 0, 0], [1, 0, 0], [1, 0, 0], [-1, 0, 0], 0.2, 0.5), None)
+        self.assertEqual(contactTime([-1, 0.5, 0], [1, 0, 0], [1, 0, 0], [-1, 0, 0], 0.2, 10), None)
+
+        # Already touching counts only while approaching
+        self.assertEqual(contactTime([0, 0, 0], [1, 0, 0], [0.1, 0, 0], [0, 0, 0], 0.2, 1), 0)
+        self.assertEqual(contactTime([0, 0, 0], [-1, 0, 0], [0.1, 0, 0], [0, 0, 0], 0.2, 1), None)
+
+    def test_inelasticStep(self):
+        class Ball:
+            pass
+        ball1 = Ball()
+        ball1.pos, ball1.v, ball1.m, ball1.radius = vector(-1, 0, 0), vector(1, 0, 0), 1.0, 0.1
+        ball2 = Ball()
+        ball2.pos, ball2.v, ball2.m, ball2.radius = vector(1, 0, 0), vector(-1, 0, 0), 3.0, 0.1
+        self.assertAlmostEqual(inelasticStep(ball1, ball2, 2), 0.9)
+        self.assertAlmostEqual(ball1.v.x, -0.5)
+        self.assertAlmostEqual(ball2.v.x, -0.5)
+        self.assertAlmostEqual(ball1.pos.x, -0.1 - 0.5 * 1.1)
+        self.assertAlmostEqual(ball2.pos.x - ball1.pos.x, 0.2)
+        self.assertEqual(inelasticStep(ball1, ball2, 2), None)
+
+class TestPhysCollisions(unittest.TestCase):
+    def test_pairs(self):
+        # The grid finds exactly the pairs a test of every pair finds
+        random = numpy.random.RandomState(3)
+        pos = random.uniform(-1, 1, size=(800, 3))
+        radius = random.uniform(0.01, 0.05, size=800)
+        collisions = PhysCollisions(radius, 1)
+        found = set(map(tuple, collisions.pairs(pos)))
+        d = numpy.sqrt(numpy.sum((pos[:, numpy.newaxis] - pos[numpy.newaxis]) ** 2, axis=2))
+        i, j = numpy.nonzero(d < radius[:, numpy.newaxis] + radius[numpy.newaxis, :])
+        self.assertEqual(found, set((a, b) for a, b in zip(i, j) if a < b))
+        self.assertTrue(collisions.numCandidates < 800 * 799 / 20)
+
+    def test_elastic(self):
+        # Equal masses hitting head on swap velocities; momentum is conserved
+        pos = numpy.array([[0, 0, 0], [0.19, 0, 0], [5, 0, 0]])
+        v = numpy.array([[1.0, 0, 0], [-2.0, 0, 0], [0, 0, 0]])
+        collisions = PhysCollisions(0.1, [1, 1, 3])
+        self.assertEqual(len(collisions.collide(pos, v)), 1)
+        self.assertTrue(numpy.allclose(v[:, 0], [-2, 1, 0]))
+
+        # Moving apart already: nothing happens
+        collisions.collide(pos, v)
+        self.assertTrue(numpy.allclose(v[:, 0], [-2, 1, 0]))
+
+        # A step of 1 s would carry the spheres through each other; with dt they still
+        # collide, when they touch 0.4 s into the step, and bounce back from there
+        pos = numpy.array([[0.0, 0, 0], [1.0, 0, 0]])
+        v = numpy.array([[1.0, 0, 0], [-1.0, 0, 0]])
+        self.assertEqual(len(collisions.collide(pos, v)), 0)
+        self.assertEqual(len(collisions.collide(pos, v, dt=1)), 1)
+        self.assertTrue(numpy.allclose(v[:, 0], [-1, 1]))
+        self.assertTrue(numpy.allclose(pos[:, 0], [-0.2, 1.2]))
+
+        # Glancing contact: the impulse is along the line of centers at contact, not now
+        pos = numpy.array([[0.0, 0, 0], [1.0, 0.1, 0]])
+        v = numpy.array([[0.0, 0, 0], [-1.0, 0, 0]])
+        collisions.collide(pos, v, dt=1)
+        contact = math.sqrt(0.2 ** 2 - 0.1 ** 2)
+        self.assertAlmostEqual(v[0, 0], -contact ** 2 / 0.04)
+        self.assertAlmostEqual(v[0, 1], -contact * 0.1 / 0.04)
+        self.assertAlmostEqual(v[0].dot(v[1]), 0)
+        self.assertAlmostEqual(pos[0, 0], v[0, 0] * contact)
+
+    def test_points(self):
+        # Spheres of no size at rest have no collision reach, but must not break the grid
+        collisions = PhysCollisions(0, 1)
+        self.assertEqual(collisions.pairs(numpy.array([[0.0, 0, 0], [1, 0, 0]])).shape, (0, 2))
+        self.assertEqual(len(collisions.pairs(numpy.zeros((2, 3)))), 0)
+        self.assertEqual(len(collisions.pairs(numpy.array([[0.0, 0, 0], [1, 0, 0]]), numpy.zeros((2, 3)), dt=1)), 0)
+
+    def test_merge(self):
+        # A chain of three touching spheres moves off together with the total momentum
+        pos = numpy.array([[0, 0, 0], [0.15, 0, 0], [0.3, 0, 0], [3, 0, 0]])
+        v = numpy.array([[1.0, 0, 0], [0, 0, 0], [0, 1.0, 0], [0, 0, 2.0]])
+        PhysCollisions(0.1, [1, 2, 1, 1], merge=True).collide(pos, v)
+        self.assertTrue(numpy.allclose(v[:3], [[0.25, 0.25, 0]] * 3))
+        self.assertTrue(numpy.allclose(v[3], [0, 0, 2]))
+
+class TestMarkerSchedule(unittest.TestCase):
+    def setUp(self):
+        self.obj = Mock("obj")
+        self.obj.pos = vector(0,0,0)
+
+    def markers(self, motionMap, times):
+        # Markers placed by one update call per sample
+        for t in times:
+            motionMap.update(t)
+        return motionMap.curMarker
+
+    def test_updateStep(self):
+        byTime = MotionMap(self.obj, 10, 5, markerType="breadcrumbs", labelMarkerOrder=False)
+        byStep = MotionMap(self.obj, 10, 5, markerType="breadcrumbs", labelMarkerOrder=False, dt=0.5)
+        for step in range(21):
+            byStep.updateStep(step)
+            self.assertEqual(byStep.curMarker, self.markers(byTime, [step * 0.5]))
+        self.assertEqual(byStep.curMarker, 5)
+        self.assertRaises(Exception, MotionMap(self.obj, 10, 5).updateStep, 0)
+
+        mapN = MotionMapN(self.obj, 0.1, 5, labelMarkerOrder=False)
+        for step in range(21):
+            mapN.updateStep(step)
+        self.assertEqual(mapN.curMarker, 5)
+
+    def test_markTrajectory(self):
+        # Dense and sparse recordings give the markers a live run would have
+        for times in (numpy.arange(0, 10, 0.3), numpy.array([0, 0.1, 5, 5.5, 6, 9.9, 12])):
+            for makeMap in (lambda: MotionMap(self.obj, 10, 5, labelMarkerOrder=False),
+                            lambda: MotionMapN(self.obj, 0.5, 3, labelMarkerOrder=False)):
+                label.reset()
+                retroactive = makeMap()
+                retroactive.dropTime = True
+                numPlaced = retroactive.markTrajectory(times, numpy.zeros((len(times), 3)), numpy.ones((len(times), 3)))
+                self.assertEqual(numPlaced, self.markers(makeMap(), times))
+                self.assertEqual(retroactive.curMarker, numPlaced)
+                self.assertEqual(label.called, numPlaced)
+
+class TestMarkerPool(unittest.TestCase):
+    def test_maxMarkers(self):
+        obj = Mock("obj")
+        obj.pos = vector(0,0,0)
+        arrow.reset()
+        label.reset()
+        motionMap = MotionMapN(obj, 1, 1, dropTime=True, maxMarkers=3)
+        for step in range(10):
+            obj.pos = vector(step, 0, 0)
+            motionMap.updateStep(step, vector(1, 0, 0))
+
+        # Only three sets of scene objects, the oldest moved along to the newest marker
+        self.assertEqual(motionMap.curMarker, 10)
+        self.assertEqual(len(motionMap.markers), 3)
+        self.assertEqual(arrow.called, 3)
+        self.assertEqual(label.called, 6)
+        self.assertEqual(motionMap.oldestMarker, 1)
+        self.assertEqual(arrow.pos, vector(9, 0, 0))
+        self.assertEqual(label.text, "10")
+
+        # Without a cap every marker keeps its own objects
+        unlimited = MotionMap(obj, 10, 10, labelMarkerOrder=False)
+        unlimited.markTrajectory(numpy.arange(0, 10, 0.5), numpy.zeros((20, 3)), numpy.ones((20, 3)))
+        self.assertEqual(len(unlimited.markers), 10)
+
+class TestPhysFrameAxis(unittest.TestCase):
+    def setUp(self):
+        self.obj = Mock("obj")
+        self.obj.pos = vector(0,0,0)
+        points.reset()
+        curve.reset()
+        label.reset()
+        frame.reset()
+        self.physAxis = PhysFrameAxis(self.obj, 50, startPos=vector(0,1,0), length=10, labelOrientation="left")
+
+    def test_init(self):
+        # One frame, one points object and one curve, however many ticks
+        self.assertEqual(frame.called, 1)
+        self.assertEqual(points.called, 1)
+        self.assertEqual(curve.called, 1)
+        self.assertEqual(label.called, 50)
+        self.assertEqual(len(points.pos), 50)
+        self.assertEqual(points.pos[-1], vector(10,1,0))
+        self.assertEqual(points.frame, self.physAxis.frame)
+        self.assertEqual(self.physAxis.intervalLabels[-1].text, "10.00")
+
+    def test_update(self):
+        self.physAxis.update()
+        self.assertEqual(self.physAxis.frame.pos, vector(0,0,0))
+
+        self.obj.pos = vector(1,2,3)
+        self.physAxis.update()
+        self.assertEqual(self.physAxis.frame.pos, vector(1,2,3))
+        self.assertEqual(self.physAxis.intervalLabels[-1].pos, vector(1,2,3)+vector(10,1,0)+vector(-1,0,0))
+        self.assertEqual(points.pos[-1], vector(10,1,0))
+
+    def test_reorient(self):
+        self.physAxis.reorient(axis=vector(0,0,1), length=1, labels=[str(i) for i in range(50)], labelOrientation="right")
+        self.assertEqual(points.called, 1)
+        self.assertEqual(label.called, 50)
+        self.assertAlmostEqual(points.pos[-1].z, 1)
+        self.assertEqual(self.physAxis.intervalLabels[-1].text, "49")
+
+class TestTimerWrites(unittest.TestCase):
+    class CountingLabel:
+        def __init__(self):
+            self.__dict__["writes"] = 0
+            self.__dict__["text"] = ""
+
+        def __setattr__(self, name, value):
+            if name == "text":
+                self.__dict__["writes"] += 1
+            self.__dict__[name] = value
+
+    def reference(self, t, useScientific):
+        # The text the timer has always shown
+        if useScientific:
+            return "%.4E" % t
+        frac = int(round(100 * (t % 1)))
+        secs = int(t % 60) + (1 if frac == 100 else 0)
+        return "%02d:%02d:%02d.%02d" % (int(t / 3600), int((t / 60) % 60), secs, frac % 100)
+
+    def test_update(self):
+        for useScientific, start, dt in ((False, 58.5, 0.0007), (False, 3599.99, 0.0001), (True, 0.0099, 1e-7)):
+            timer = PhysTimer(1, 1, useScientific=useScientific)
+            timer.timerLabel = TestTimerWrites.CountingLabel()
+            texts = set()
+            for i in range(5000):
+                t = start + i * dt
+                timer.update(t)
+                self.assertEqual(timer.timerLabel.text, self.reference(t, useScientific))
+                texts.add(timer.timerLabel.text)
+
+            # One write per different text
+            self.assertEqual(timer.timerLabel.writes, len(texts))
+
+class TestPhysLoop(unittest.TestCase):
+    def setUp(self):
+        self.ball = Mock("ball")
+        self.ball.pos = vector(0, 10, 0)
+        self.ball.v = vector(0, 0, 0)
+        del gcurve.plots[:]
+        rate.reset()
+
+    def fall(self, t, deltat):
+        self.ball.v = self.ball.v + vector(0, -9.8, 0) * deltat
+        self.ball.pos = self.ball.pos + self.ball.v * deltat
+
+    def test_stepsPerFrame(self):
+        loop = PhysLoop(0.001, stepsPerFrame=100)
+        graph = PhysGraph()
+        loop.addGraph(graph, lambda: self.ball.pos.y)
+        t = loop.run(self.fall, tEnd=1)
+
+        # 1000 steps, but only 10 frames of drawing (plus one to show the end)
+        self.assertAlmostEqual(t, 1)
+        self.assertEqual(loop.stepCount, 1000)
+        self.assertEqual(loop.frameCount, 11)
+        self.assertEqual(rate.called, 10)
+        self.assertEqual(len(gcurve.plots), 11)
+        self.assertAlmostEqual(gcurve.plots[-1][1], self.ball.pos.y)
+        del gcurve.plots[:]
+
+    def test_running(self):
+        # As fast as the physics allows, until the ball reaches the ground
+        loop = PhysLoop(0.0001, fps=1000)
+        motionMap = MotionMap(self.ball, 2, 4, labelMarkerOrder=False)
+        loop.addMotionMap(motionMap, lambda: self.ball.v)
+        loop.run(self.fall, running=lambda t: self.ball.pos.y >= 0)
+        self.assertTrue(self.ball.pos.y < 0)
+        self.assertAlmostEqual(loop.t, math.sqrt(20 / 9.8), 3)
+        self.assertTrue(loop.frameCount <= loop.stepCount)
+        self.assertEqual(motionMap.curMarker, 3)
+        self.assertRaises(Exception, loop.run, self.fall)
 
 # Now set up unittests to be executed when module is run individually
+# (or run the given models headless with "python physutil.py --headless model.py")
 if __name__ == "__main__":
-    print("Beginning unit tests!")
-    unittest.main()
+    if sys.argv[1:2] == ["--headless"]:
+        runHeadless(*sys.argv[2:])
+    else:
+        print("Beginning unit tests!")
+        unittest.main()
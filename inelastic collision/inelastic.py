@@ -69,17 +69,10 @@ while mag(ball1.pos) < 2 and mag(ball2.pos) < 2 :  # while the balls are within
     ball1.v = ball1.v + (Fnet/ball1.m * deltat)
     ball2.v = ball2.v + (Fnet/ball2.m * deltat)
 
-    # Position update 
-    ball1.pos = ball1.pos + ball1.v * deltat
-    ball2.pos = ball2.pos + ball2.v * deltat
-    
-    # check if the balls collided
-    if mag(ball1.pos - ball2.pos) < ((ball1.radius + ball2.radius) / 2):
-        # calculate the total momentum
-        totalMomentum = (ball1.m * ball1.v) + (ball2.m * ball2.v)
-        
-        # calculate the velocity of the combined ball
-        ball1.v = ball2.v = totalMomentum / (ball1.m + ball2.m)
+    # Position update; if the balls touch during the step, they are moved to the
+    #    moment of contact and combined there (their velocities become the total
+    #    momentum divided by the total mass), so large steps can't skip the collision
+    inelasticStep(ball1, ball2, deltat, (ball1.radius + ball2.radius) / 2)
         
 
     # Update motion map, timer
@@ -51,6 +51,22 @@ satellite.m = 1000 # mass of satellite in kg
 satellite.pos = vector(5*4.23e7, 3*4.23e7, 0) # initial position of the satellite, units are in meters
 satellite.v = vector(-.0*3.07e3, -.4*3.07e3, 0) # initial velocity of the satellite
 
+# Set movingStars to True to let the stars orbit their common center of mass;
+# False holds them fixed in place
+movingStars = False
+
+if movingStars:
+    # Give the stars the speeds for a circular orbit about their center of mass
+    separation = mag(earth2.pos - earth1.pos)
+    vRelative = sqrt((6.673e-11) * (earth1.m + earth2.m) / separation)
+    earth1.v = vector(0, -vRelative * earth2.m / (earth1.m + earth2.m), 0)
+    earth2.v = vector(0, vRelative * earth1.m / (earth1.m + earth2.m), 0)
+
+    # The stars' positions come from the exact two-body solution rather than
+    # being stepped along with the satellite (the satellite is too light to
+    # affect them)
+    stars = PhysBinary(earth1.m, earth2.m, earth1.pos, earth2.pos, earth1.v, earth2.v)
+
 # Define time parameters
 t = 0 # starting time
 deltat = 36  # time step units are s
@@ -65,8 +81,12 @@ while t < 5000000 :
     #    than 1000 frames/s)
     rate(1000)    # 1000
 
-    # Note: This model makes the false assumption that the stars are stationary
-    #in space
+    # Note: unless movingStars is True, this model makes the false assumption
+    # that the stars are stationary in space
+    if movingStars:
+        starPos = stars.positions(t)
+        earth1.pos = vector(starPos[0])
+        earth2.pos = vector(starPos[1])
     
     # Force on satellite by both stars
     Fg1 = (6.673e-11) * satellite.m * earth1.m / ((earth1.pos.x - satellite.pos.x)**2 + (earth1.pos.y - satellite.pos.y)**2)
@@ -49,6 +49,9 @@ satellite.m = 1000 # mass of satellite in kg
 satellite.pos = vector(4.23e7, 0, 0) # initial position of the satellite, units are in meters
 satellite.v = vector(0, 3.07e3, 0) # initial velocity of the satellite
 
+# Exact orbit for the same starting conditions, to compare the model against
+exactOrbit = PhysKepler(satellite.pos, satellite.v, earth.m)
+
 # Define time parameters
 t = 0 # starting time
 deltat = 36  # time step units are s
@@ -92,3 +95,6 @@ while t < 1200000 :
 print t
 print satellite.v
 print Fnet/satellite.m
+
+# Print how far the modelled satellite has drifted from the exact orbit
+print mag(satellite.pos - vector(exactOrbit.position(t)))